@@ -2,11 +2,10 @@ import streamlit as st
 import bcrypt
 import os
 from datetime import datetime
-from auth import AuthManager
-from database import DatabaseManager
-from encryption_utils import CaesarCipher
-from chat_manager import ChatManager
-from key_manager import KeyManager
+from event_bus import user_topic
+from password_hasher import HasherBusyError
+from rate_limiter import RateLimitedError
+from services import get_services
 from utils import validate_input, sanitize_html, format_timestamp
 
 # تكوين الصفحة
@@ -20,13 +19,7 @@ st.set_page_config(
 # تهيئة مديري النظام
 @st.cache_resource
 def init_managers():
-    return {
-        'auth': AuthManager(),
-        'db': DatabaseManager(),
-        'encryption': CaesarCipher(),
-        'chat': ChatManager(),
-        'key': KeyManager()
-    }
+    return get_services().as_dict()
 
 managers = init_managers()
 
@@ -37,6 +30,24 @@ if 'current_conversation' not in st.session_state:
     st.session_state.current_conversation = None
 if 'page' not in st.session_state:
     st.session_state.page = 'login'
+if 'chat_history' not in st.session_state:
+    st.session_state.chat_history = {}
+
+# استئناف الجلسة من الرمز الموقع في الرابط بدون إعادة إدخال كلمة المرور
+if st.session_state.current_user is None and 'session' in st.query_params:
+    resumed_user = managers['auth'].resume(st.query_params['session'])
+    if resumed_user:
+        st.session_state.current_user = resumed_user
+        st.session_state.page = 'chat'
+    else:
+        del st.query_params['session']
+
+# عدد الرسائل في كل صفحة من سجل المحادثة
+MESSAGES_PAGE_SIZE = 50
+# الحد الأقصى للرسائل الجديدة التي تُجلب بعد آخر رسالة محملة
+MAX_LIVE_MESSAGES = 500
+# الفاصل الزمني (بالثواني) لفحص أحداث الرسائل الجديدة في المحادثة المفتوحة
+MESSAGES_POLL_SECONDS = 3
 
 def show_header():
     """عرض رأس الصفحة مع معلومات المشروع"""
@@ -73,9 +84,17 @@ def show_login_page():
             
             if submit:
                 if username and password:
-                    user = managers['auth'].login(username, password)
+                    try:
+                        user = managers['auth'].login(username, password, client_id=st.context.ip_address)
+                    except RateLimitedError:
+                        st.error("🚫 محاولات كثيرة، يرجى المحاولة مرة أخرى بعد قليل")
+                        return
+                    except (HasherBusyError, TimeoutError):
+                        st.error("⏳ الخادم مشغول حالياً، يرجى المحاولة مرة أخرى بعد لحظات")
+                        return
                     if user:
                         st.session_state.current_user = user
+                        st.query_params['session'] = user['session_token']
                         st.session_state.page = 'chat'
                         st.success("✅ تم تسجيل الدخول بنجاح!")
                         st.rerun()
@@ -143,7 +162,9 @@ def show_chat_interface():
         st.markdown("### 📋 المحادثات والأصدقاء")
         
         # أزرار التنقل
-        tab1, tab2 = st.tabs(["💬 المحادثات", "👥 الأصدقاء"])
+        unread_total = managers['chat'].get_unread_count(st.session_state.current_user['id'])
+        conversations_label = f"💬 المحادثات ({unread_total})" if unread_total else "💬 المحادثات"
+        tab1, tab2 = st.tabs([conversations_label, "👥 الأصدقاء"])
         
         with tab1:
             show_conversations_tab()
@@ -154,7 +175,14 @@ def show_chat_interface():
         # زر تسجيل الخروج
         st.markdown("---")
         if st.button("🚪 تسجيل الخروج", use_container_width=True):
-            managers['db'].update_user_online_status(st.session_state.current_user['id'], False)
+            managers['presence'].disconnect(st.session_state.current_user['id'])
+            session_token = st.session_state.current_user.get('session_token')
+            if session_token:
+                managers['sessions'].revoke(session_token)
+            st.query_params.pop('session', None)
+            subscription = st.session_state.pop('events', None)
+            if subscription is not None:
+                subscription.close()
             st.session_state.current_user = None
             st.session_state.current_conversation = None
             st.session_state.page = 'login'
@@ -174,8 +202,11 @@ def show_conversations_tab():
         for conv in conversations:
             last_msg = conv.get('last_message', 'لا توجد رسائل')[:30] + "..." if len(conv.get('last_message', '')) > 30 else conv.get('last_message', 'لا توجد رسائل')
             
+            unread = conv.get('unread_count', 0)
+            badge = f" 🔴 {unread}" if unread else ""
+            
             if st.button(
-                f"👤 **{conv['name']}**\n📝 {last_msg}",
+                f"👤 **{conv['name']}**{badge}\n📝 {last_msg}",
                 key=f"conv_{conv['id']}",
                 use_container_width=True
             ):
@@ -230,6 +261,127 @@ def show_friends_tab():
                         else:
                             st.error("❌ فشل في إرسال طلب الصداقة")
 
+def load_latest_messages(conversation_id):
+    """تحميل أحدث صفحة من المحادثة وبدء سجل جديد لها"""
+    page = managers['chat'].get_conversation_messages_page(conversation_id, limit=MESSAGES_PAGE_SIZE)
+    messages = list(page['messages'])
+    history = {
+        'conversation_id': conversation_id,
+        'messages': messages,
+        'older_cursor': page['older_cursor'] if page['has_older'] else None,
+        'version': messages[-1]['seq'] if messages else 0
+    }
+    st.session_state.chat_history = history
+    return history
+
+def build_message_bubble(content, is_sent):
+    """بناء فقاعة الرسالة كأجزاء حول اسم المرسل والوقت (يتغيران عند كل عرض)"""
+    if is_sent:
+        head = """
+    <div style='text-align: right; margin: 10px 0;'>
+        <div style='background-color: #dcf8c6; padding: 10px 15px; border-radius: 15px; display: inline-block; max-width: 70%; border: 1px solid #a5d6a7;'>
+            <strong>"""
+    else:
+        head = """
+    <div style='text-align: left; margin: 10px 0;'>
+        <div style='background-color: #ffffff; padding: 10px 15px; border-radius: 15px; display: inline-block; max-width: 70%; border: 1px solid #ddd;'>
+            <strong>"""
+    middle = f""":</strong><br>
+            {content}<br>
+            <small style='color: #666;'>"""
+    tail = """ 🔐</small>
+        </div>
+    </div>
+    """
+    return head, middle, tail
+
+def render_messages(messages, user_id):
+    """HTML الرسائل: فك التشفير والتنظيف يتمان عند أول عرض فقط
+    
+    الرسائل غير الموجودة في ذاكرة العرض تُفك دفعة واحدة.
+    """
+    encryptor = managers['encryption']
+    render_cache = managers['render_cache']
+    shift = encryptor.get_shift()
+    
+    keys = [(msg['id'], shift, msg['sender_id'] == user_id) for msg in messages]
+    bubbles = [render_cache.get(key) for key in keys]
+    missing = [i for i, bubble in enumerate(bubbles) if bubble is None]
+    if missing:
+        plaintexts = encryptor.decrypt_many(messages[i]['content'] for i in missing)
+        for i, plaintext in zip(missing, plaintexts):
+            bubbles[i] = build_message_bubble(sanitize_html(plaintext), keys[i][2])
+            render_cache.put(keys[i], bubbles[i])
+    
+    rendered = []
+    for msg, (_, _, is_sent), (head, middle, tail) in zip(messages, keys, bubbles):
+        # الوقت نسبي ("منذ 5 دقيقة") لذلك يُحسب عند كل عرض
+        timestamp = format_timestamp(msg.get('created_at', ''))
+        sender_name = "أنت" if is_sent else msg.get('sender_name', 'مستخدم')
+        rendered.append(f"{head}{sender_name}{middle}{timestamp}{tail}")
+    return rendered
+
+def get_event_subscription(user_id):
+    """اشتراك الجلسة في أحداث المستخدم، مع إعادة الاشتراك إذا انتهت صلاحيته
+    
+    يعيد (الاشتراك، هل هو جديد). الاشتراك الجديد قد يكون فاته أحداث.
+    """
+    subscription = st.session_state.get('events')
+    if subscription is not None and not subscription.closed and user_topic(user_id) in subscription.topics:
+        return subscription, False
+    subscription = managers['events'].subscribe([user_topic(user_id)])
+    st.session_state.events = subscription
+    return subscription, True
+
+@st.fragment(run_every=MESSAGES_POLL_SECONDS)
+def show_messages(conv):
+    """عرض الرسائل مع تحديث تلقائي يجلب الرسائل الجديدة عند وصول أحداثها
+    
+    الأحداث تصل فقط من نفس العملية، لذلك يُقارن إصدار المحادثة (بحث بالمفتاح
+    الأساسي) في كل دورة حتى تظهر رسائل العمليات الأخرى.
+    """
+    subscription, fresh = get_event_subscription(st.session_state.current_user['id'])
+    changed = {event['conversation_id'] for event in subscription.drain()}
+    
+    history = st.session_state.chat_history
+    if history.get('conversation_id') != conv['id']:
+        history = load_latest_messages(conv['id'])
+    elif (fresh or conv['id'] in changed
+          or managers['chat'].get_conversation_version(conv['id']) > history['version']):
+        new = managers['chat'].get_messages_since(conv['id'], history['version'], MAX_LIVE_MESSAGES)
+        if new['has_more']:
+            history = load_latest_messages(conv['id'])
+        elif new['messages']:
+            history['messages'].extend(new['messages'])
+            history['version'] = new['version']
+    
+    if changed - {conv['id']}:
+        # رسائل جديدة في محادثات أخرى: إعادة التشغيل لتحديث عدادات الشريط الجانبي
+        st.rerun()
+    messages = history['messages']
+    
+    if history['older_cursor']:
+        if st.button("⬆️ تحميل رسائل أقدم", key="load_older", use_container_width=True):
+            older = managers['chat'].get_conversation_messages_page(
+                conv['id'], limit=MESSAGES_PAGE_SIZE, before=history['older_cursor']
+            )
+            history['messages'] = list(older['messages']) + messages
+            history['older_cursor'] = older['older_cursor'] if older['has_older'] else None
+            st.rerun(scope="fragment")
+    
+    # تقديم علامة القراءة عند ظهور رسائل جديدة فقط
+    if messages:
+        read_marker = (conv['id'], messages[-1]['id'])
+        if st.session_state.get('read_marker') != read_marker:
+            managers['chat'].mark_conversation_as_read(conv['id'], st.session_state.current_user['id'])
+            st.session_state.read_marker = read_marker
+    
+    if messages:
+        for html in render_messages(messages, st.session_state.current_user['id']):
+            st.markdown(html, unsafe_allow_html=True)
+    else:
+        st.info("🎉 ابدأ المحادثة بإرسال أول رسالة!")
+
 def show_chat_area():
     """منطقة الدردشة"""
     conv = st.session_state.current_conversation
@@ -242,44 +394,7 @@ def show_chat_area():
     """)
     
     # منطقة الرسائل
-    messages_container = st.container()
-    
-    with messages_container:
-        messages = managers['chat'].get_conversation_messages(conv['id'])
-        
-        if messages:
-            for msg in messages[-50:]:  # آخر 50 رسالة
-                is_sent = msg['sender_id'] == st.session_state.current_user['id']
-                
-                # فك التشفير التلقائي
-                decrypted_content = managers['encryption'].decrypt(msg['content'])
-                
-                # تصميم الرسالة
-                timestamp = format_timestamp(msg.get('created_at', ''))
-                sender_name = "أنت" if is_sent else msg.get('sender_name', 'مستخدم')
-                
-                if is_sent:
-                    st.markdown(f"""
-                    <div style='text-align: right; margin: 10px 0;'>
-                        <div style='background-color: #dcf8c6; padding: 10px 15px; border-radius: 15px; display: inline-block; max-width: 70%; border: 1px solid #a5d6a7;'>
-                            <strong>{sender_name}:</strong><br>
-                            {sanitize_html(decrypted_content)}<br>
-                            <small style='color: #666;'>{timestamp} 🔐</small>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div style='text-align: left; margin: 10px 0;'>
-                        <div style='background-color: #ffffff; padding: 10px 15px; border-radius: 15px; display: inline-block; max-width: 70%; border: 1px solid #ddd;'>
-                            <strong>{sender_name}:</strong><br>
-                            {sanitize_html(decrypted_content)}<br>
-                            <small style='color: #666;'>{timestamp} 🔐</small>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-        else:
-            st.info("🎉 ابدأ المحادثة بإرسال أول رسالة!")
+    show_messages(conv)
     
     # منطقة إرسال الرسائل
     st.markdown("---")
@@ -344,9 +459,9 @@ def show_welcome_screen():
     *التشفير يتم تلقائياً - لا تحتاج لفعل أي شيء إضافي!*
     """)
 
-# تحديث حالة الاتصال
+# تحديث حالة الاتصال (نبضة في الذاكرة تُكتب على دفعات)
 if st.session_state.current_user:
-    managers['db'].update_user_online_status(st.session_state.current_user['id'], True)
+    managers['presence'].heartbeat(st.session_state.current_user['id'])
 
 # التنقل بين الصفحات
 if st.session_state.page == 'login':
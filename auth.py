@@ -1,27 +1,62 @@
-import bcrypt
 import secrets
+from dataclasses import replace
 from database import DatabaseManager
+from password_hasher import PasswordHasher, HasherBusyError
+from rate_limiter import LoginRateLimiter, RateLimitedError
+from sessions import SessionManager
 from utils import validate_email, generate_unique_id
 
 class AuthManager:
     """إدارة المصادقة والمستخدمين"""
     
-    def __init__(self):
-        self.db = DatabaseManager()
+    def __init__(self, db=None, hasher=None, limiter=None, sessions=None):
+        self.db = db if db is not None else DatabaseManager()
+        self.hasher = hasher if hasher is not None else PasswordHasher()
+        self.limiter = limiter if limiter is not None else LoginRateLimiter()
+        self.sessions = sessions if sessions is not None else SessionManager(self.db)
+        self._dummy_hash = None
     
     def hash_password(self, password: str) -> str:
-        """تشفير كلمة المرور"""
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hashed.decode('utf-8')
+        """تشفير كلمة المرور (في مجمع خيوط bcrypt)"""
+        return self.hasher.hash(password)
     
     def verify_password(self, password: str, hashed: str) -> bool:
         """التحقق من كلمة المرور"""
         try:
-            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-        except:
+            return self.hasher.verify(password, hashed)
+        except (HasherBusyError, TimeoutError):
+            # الضغط الزائد ليس كلمة مرور خاطئة
+            raise
+        except Exception:
             return False
     
+    def _verify_missing_user(self, password: str):
+        """تحقق وهمي بنفس تكلفة التحقق الحقيقي حتى لا يكشف الزمن وجود الحساب"""
+        if self._dummy_hash is None or self.hasher.needs_rehash(self._dummy_hash):
+            self._dummy_hash = self.hash_password(secrets.token_hex(16))
+        self.verify_password(password, self._dummy_hash)
+    
+    def _upgrade_password_hash(self, user_id: str, password: str, hashed: str):
+        """إعادة تجزئة كلمة المرور بعامل التكلفة الحالي بعد دخول ناجح"""
+        if not self.hasher.needs_rehash(hashed):
+            return
+        try:
+            self.db.update_user_password(user_id, self.hash_password(password))
+        except Exception as e:
+            print(f"Error upgrading password hash: {e}")
+    
+    def _logged_in_user(self, user) -> dict:
+        """تحديث حالة الاتصال وإرجاع بيانات المستخدم بدون كلمة المرور"""
+        self.db.update_user_online_status(user['id'], True)
+        return {
+            'id': user['id'],
+            'username': user['username'],
+            'email': user['email'],
+            'display_name': user['display_name'],
+            'avatar': user.get('avatar'),
+            'is_online': True
+        }
+    
     def register(self, username: str, email: str, password: str, display_name: str) -> bool:
         """تسجيل مستخدم جديد"""
         try:
@@ -46,38 +81,71 @@ class AuthManager:
             print(f"Error in register: {e}")
             return False
     
-    def login(self, username: str, password: str) -> dict:
-        """تسجيل الدخول"""
+    def login(self, username: str, password: str, client_id: str = None) -> dict:
+        """تسجيل الدخول
+        
+        ``client_id`` يعرّف العميل (مثلاً عنوان IP) لميزانية التحقق لكل عميل.
+        النتيجة تحتوي ``session_token`` لاستئناف الجلسة لاحقاً عبر ``resume``.
+        عند امتلاء مجمع bcrypt يُرفع HasherBusyError أو TimeoutError، وعند تجاوز
+        ميزانية المحاولات RateLimitedError، بدلاً من None حتى لا يظهر الضغط
+        الزائد أو الحد كبيانات دخول خاطئة.
+        """
         try:
             # البحث عن المستخدم
             user = self.db.get_user_by_username(username)
-            if not user:
+            if not user and '@' in username:
                 # محاولة البحث بالبريد الإلكتروني
                 user = self.db.get_user_by_email(username)
             
-            if user and self.verify_password(password, user['password_hash']):
-                # تحديث حالة الاتصال
-                self.db.update_user_online_status(user['id'], True)
+            # رفض رخيص قبل أي عملية bcrypt عند تجاوز الميزانية
+            account = user['id'] if user else f"unknown:{username.casefold()}"
+            if not self.limiter.acquire(account, client_id):
+                raise RateLimitedError("Too many login attempts")
+            
+            if not user:
+                self._verify_missing_user(password)
+                return None
+            
+            password_hash = self.db.get_password_hash(user['id'])
+            if password_hash and self.verify_password(password, password_hash):
+                self._upgrade_password_hash(user['id'], password, password_hash)
                 
-                # إرجاع بيانات المستخدم بدون كلمة المرور
-                return {
-                    'id': user['id'],
-                    'username': user['username'],
-                    'email': user['email'],
-                    'display_name': user['display_name'],
-                    'avatar': user.get('avatar'),
-                    'is_online': True
-                }
+                result = self._logged_in_user(user)
+                result['session_token'] = self.sessions.issue(user['id'])
+                return result
             
             return None
             
+        except (HasherBusyError, TimeoutError, RateLimitedError):
+            raise
         except Exception as e:
             print(f"Error in login: {e}")
             return None
     
-    def logout(self, user_id: str) -> bool:
-        """تسجيل الخروج"""
+    def resume(self, token: str) -> dict:
+        """استئناف جلسة من رمزها بدون التحقق من كلمة المرور (HMAC واستعلام مفهرس فقط)"""
         try:
+            user_id = self.sessions.validate(token)
+            if user_id is None:
+                return None
+            
+            user = self.db.get_user_by_id(user_id)
+            if not user:
+                return None
+            
+            result = self._logged_in_user(user)
+            result['session_token'] = token
+            return result
+            
+        except Exception as e:
+            print(f"Error in resume: {e}")
+            return None
+    
+    def logout(self, user_id: str, session_token: str = None) -> bool:
+        """تسجيل الخروج وإلغاء رمز الجلسة"""
+        try:
+            if session_token:
+                self.sessions.revoke(session_token)
             self.db.update_user_online_status(user_id, False)
             return True
         except Exception as e:
@@ -85,13 +153,21 @@ class AuthManager:
             return False
     
     def change_password(self, user_id: str, old_password: str, new_password: str) -> bool:
-        """تغيير كلمة المرور"""
+        """تغيير كلمة المرور
+        
+        يُرفع RateLimitedError عند تجاوز ميزانية المحاولات، و HasherBusyError أو
+        TimeoutError عند امتلاء مجمع bcrypt، بدلاً من False (كلمة مرور خاطئة).
+        """
         try:
             user = self.db.get_user_by_id(user_id)
             if not user:
                 return False
             
-            if not self.verify_password(old_password, user['password_hash']):
+            if not self.limiter.acquire(user_id):
+                raise RateLimitedError("Too many password attempts")
+            
+            password_hash = self.db.get_password_hash(user_id)
+            if not password_hash or not self.verify_password(old_password, password_hash):
                 return False
             
             if len(new_password) < 6:
@@ -99,8 +175,12 @@ class AuthManager:
             
             new_password_hash = self.hash_password(new_password)
             self.db.update_user_password(user_id, new_password_hash)
+            # كلمة المرور القديمة قد تكون مسربة: إلغاء كل الجلسات المفتوحة
+            self.sessions.revoke_user(user_id)
             return True
             
+        except (HasherBusyError, TimeoutError, RateLimitedError):
+            raise
         except Exception as e:
             print(f"Error in change_password: {e}")
             return False
@@ -122,9 +202,8 @@ class AuthManager:
         try:
             user = self.db.get_user_by_id(user_id)
             if user:
-                # إزالة كلمة المرور من النتيجة
-                user.pop('password_hash', None)
-                return user
+                # إزالة كلمة المرور من نسخة النتيجة
+                return replace(user, password_hash=None)
             return None
         except Exception as e:
             print(f"Error in get_user_by_id: {e}")
@@ -1,15 +1,18 @@
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 from database import DatabaseManager
+from event_bus import conversation_topic, user_topic
 from encryption_utils import CaesarCipher
 from utils import validate_input, sanitize_html
 
 class ChatManager:
     """إدارة الدردشة والرسائل المشفرة تلقائياً"""
     
-    def __init__(self):
-        self.db = DatabaseManager()
+    def __init__(self, db=None, presence=None, events=None):
+        self.db = db if db is not None else DatabaseManager()
         self.encryptor = CaesarCipher()
+        self.presence = presence
+        self.events = events
     
     def get_user_conversations(self, user_id: str) -> List[Dict]:
         """الحصول على محادثات المستخدم"""
@@ -19,14 +22,48 @@ class ChatManager:
             print(f"Error getting conversations: {e}")
             return []
     
-    def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[Dict]:
-        """الحصول على رسائل المحادثة"""
+    def get_conversation_messages(self, conversation_id: str, limit: int = 50,
+                                  before: Optional[str] = None,
+                                  after: Optional[str] = None) -> List[Dict]:
+        """الحصول على رسائل المحادثة (أحدث صفحة افتراضياً)"""
         try:
-            return self.db.get_conversation_messages(conversation_id, limit)
+            return self.db.get_conversation_messages(conversation_id, limit, before, after)
         except Exception as e:
             print(f"Error getting messages: {e}")
             return []
     
+    def get_conversation_messages_page(self, conversation_id: str, limit: int = 50,
+                                       before: Optional[str] = None,
+                                       after: Optional[str] = None) -> Dict:
+        """الحصول على صفحة رسائل مع مؤشرات التنقل للأقدم والأحدث"""
+        try:
+            return self.db.get_conversation_messages_page(conversation_id, limit, before, after)
+        except Exception as e:
+            print(f"Error getting messages page: {e}")
+            return {
+                'messages': [],
+                'older_cursor': None,
+                'newer_cursor': None,
+                'has_older': False,
+                'has_newer': False
+            }
+    
+    def get_conversation_version(self, conversation_id: str) -> int:
+        """رقم تسلسل آخر رسالة في المحادثة (0 عند الخطأ)"""
+        try:
+            return self.db.get_conversation_version(conversation_id)
+        except Exception as e:
+            print(f"Error getting conversation version: {e}")
+            return 0
+    
+    def get_messages_since(self, conversation_id: str, seq: int, limit: int = 500) -> Dict:
+        """الحصول على الرسائل الجديدة بعد رقم تسلسل (استعلام واحد على الفهرس)"""
+        try:
+            return self.db.get_messages_since(conversation_id, seq, limit)
+        except Exception as e:
+            print(f"Error getting new messages: {e}")
+            return {'messages': [], 'version': seq, 'has_more': False}
+    
     def send_message(self, sender_id: str, conversation_id: str, encrypted_content: str) -> bool:
         """إرسال رسالة مشفرة (المحتوى مشفر بالفعل)"""
         try:
@@ -34,48 +71,78 @@ class ChatManager:
             if not encrypted_content or not encrypted_content.strip():
                 return False
             
-            # حفظ الرسالة المشفرة في قاعدة البيانات
+            # حفظ الرسالة المشفرة في قاعدة البيانات مع مقتطف مفكوك لقائمة المحادثات
             message_id = self.db.create_message(
                 conversation_id=conversation_id,
                 sender_id=sender_id,
                 content=encrypted_content,  # المحتوى مشفر بالفعل
-                message_type='text'
+                message_type='text',
+                snippet=self.encryptor.decrypt(encrypted_content)
             )
             
+            if message_id is not None:
+                self._publish_messages([(conversation_id, sender_id, message_id)])
             return message_id is not None
             
         except Exception as e:
             print(f"Error sending message: {e}")
             return False
     
-    def create_conversation(self, user1_id: str, user2_id: str) -> Optional[Dict]:
-        """إنشاء محادثة جديدة بين مستخدمين"""
+    def send_messages(self, messages: Iterable[Tuple[str, str, str]]) -> List[Optional[str]]:
+        """إرسال دفعة رسائل مشفرة في معاملة واحدة
+        
+        ``messages`` عناصر من الشكل (conversation_id, sender_id, encrypted_content).
+        يعيد معرفات الرسائل بنفس ترتيب الإدخال، وNone للرسائل الفارغة المرفوضة
+        ولرسائل الأجزاء التي فشلت معاملتها (الرسائل الأخرى محفوظة).
+        """
         try:
-            # التحقق من وجود محادثة مسبقة
-            existing_conversation = self.db.find_private_conversation(user1_id, user2_id)
-            if existing_conversation:
-                return existing_conversation
-            
-            # إنشاء محادثة جديدة
-            conversation_id = self.db.create_conversation('private')
+            items = list(messages)
+            accepted = [bool(item[2] and item[2].strip()) for item in items]
             
-            if not conversation_id:
-                return None
-            
-            # إضافة المشاركين
-            self.db.add_conversation_participant(conversation_id, user1_id, 'admin')
-            self.db.add_conversation_participant(conversation_id, user2_id, 'member')
+            valid = [item for item, ok in zip(items, accepted) if ok]
+            created = self.db.create_messages_bulk(
+                valid,
+                message_type='text',
+                snippet_for=self.encryptor.decrypt
+            )
+            self._publish_messages([
+                (conversation_id, sender_id, message_id)
+                for (conversation_id, sender_id, _), message_id in zip(valid, created)
+                if message_id is not None
+            ])
             
-            # الحصول على اسم المحادثة (اسم المستخدم الآخر)
-            other_user = self.db.get_user_by_id(user2_id)
-            conversation_name = other_user['display_name'] if other_user else "محادثة خاصة"
+            message_ids = iter(created)
+            return [next(message_ids, None) if ok else None for ok in accepted]
             
-            return {
-                'id': conversation_id,
-                'type': 'private',
-                'name': conversation_name,
-                'created_at': datetime.now().isoformat()
-            }
+        except Exception as e:
+            print(f"Error sending messages: {e}")
+            return []
+    
+    def _publish_messages(self, messages: List[Tuple[str, str, str]]):
+        """نشر أحداث message_created على مواضيع المحادثة ومشاركيها
+        
+        ``messages`` عناصر من الشكل (conversation_id, sender_id, message_id).
+        """
+        if self.events is None:
+            return
+        participants = {}
+        for conversation_id, sender_id, message_id in messages:
+            if conversation_id not in participants:
+                participants[conversation_id] = self.db.get_conversation_participant_ids(conversation_id)
+            topics = [conversation_topic(conversation_id)]
+            topics.extend(user_topic(user_id) for user_id in participants[conversation_id])
+            self.events.publish(topics, {
+                'type': 'message_created',
+                'conversation_id': conversation_id,
+                'sender_id': sender_id,
+                'message_id': message_id
+            })
+    
+    def create_conversation(self, user1_id: str, user2_id: str) -> Optional[Dict]:
+        """إنشاء محادثة جديدة بين مستخدمين (أو إعادة الموجودة)"""
+        try:
+            # البحث والإنشاء والمشاركون في معاملة واحدة على مفتاح الزوج
+            return self.db.get_or_create_private_conversation(user1_id, user2_id)
             
         except Exception as e:
             print(f"Error creating conversation: {e}")
@@ -84,13 +151,7 @@ class ChatManager:
     def get_or_create_conversation(self, user1_id: str, user2_id: str) -> Optional[Dict]:
         """الحصول على محادثة أو إنشاؤها إذا لم تكن موجودة"""
         try:
-            # البحث عن محادثة موجودة
-            existing_conversation = self.db.find_private_conversation(user1_id, user2_id)
-            if existing_conversation:
-                return existing_conversation
-            
-            # إنشاء محادثة جديدة
-            return self.create_conversation(user1_id, user2_id)
+            return self.db.get_or_create_private_conversation(user1_id, user2_id)
             
         except Exception as e:
             print(f"Error getting or creating conversation: {e}")
@@ -99,11 +160,25 @@ class ChatManager:
     def get_user_friends(self, user_id: str) -> List[Dict]:
         """الحصول على قائمة أصدقاء المستخدم"""
         try:
-            return self.db.get_user_friends(user_id)
+            friends = self.db.get_user_friends(user_id)
+            if self.presence is not None:
+                self.presence.apply(friends)
+            return friends
         except Exception as e:
             print(f"Error getting friends: {e}")
             return []
     
+    def get_friends_with_presence(self, user_ids: Iterable[str]) -> Dict[str, List[Dict]]:
+        """الحصول على قوائم أصدقاء عدة مستخدمين مع حالة الاتصال دفعة واحدة"""
+        try:
+            friends = self.db.get_users_friends(user_ids)
+            if self.presence is not None:
+                self.presence.apply([friend for rows in friends.values() for friend in rows])
+            return friends
+        except Exception as e:
+            print(f"Error getting friends: {e}")
+            return {}
+    
     def send_friend_request(self, sender_id: str, receiver_id: str) -> bool:
         """إرسال طلب صداقة"""
         try:
@@ -135,7 +210,7 @@ class ChatManager:
     def mark_conversation_as_read(self, conversation_id: str, user_id: str) -> bool:
         """تمييز المحادثة كمقروءة"""
         try:
-            # يمكن تطوير هذه الوظيفة لاحقاً
+            self.db.mark_conversation_as_read(conversation_id, user_id)
             return True
         except Exception as e:
             print(f"Error marking as read: {e}")
@@ -144,8 +219,7 @@ class ChatManager:
     def get_unread_count(self, user_id: str) -> int:
         """الحصول على عدد الرسائل غير المقروءة"""
         try:
-            # يمكن تطوير هذه الوظيفة لاحقاً
-            return 0
+            return self.db.get_unread_count(user_id)
         except Exception as e:
             print(f"Error getting unread count: {e}")
             return 0
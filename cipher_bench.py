@@ -0,0 +1,164 @@
+"""قياس أداء التشفير
+
+أداة سطر الأوامر:
+
+    python cipher_bench.py batch
+    python cipher_bench.py batch --sizes 1 100 10000 --repeat 5
+    python cipher_bench.py vigenere --lengths 50 5000
+
+``batch`` يقارن فك تشفير قيصر نصاً نصاً مع ``decrypt_many`` لكل حجم دفعة.
+النصوص المشفرة (مدخل decrypt_many في التطبيق) لا تحتوي حروفاً أو أرقاماً غير
+ASCII لأن التشفير يحولها كلها إلى ASCII، لذلك تُترجم دفعاتها كبايتات حتى لو
+احتوت رموزاً عربية أو تعبيرية. أما النص العربي غير المشفر فيمر حرفاً حرفاً على
+جدول القاموس في الحالتين، والدفعات لا تسرّعه.
+
+``vigenere`` يقارن التنفيذ الأصلي لفيجنير (حلقة على الأحرف) مع VigenereCodec
+لكل طول نص.
+"""
+import argparse
+import time
+
+from encryption import SECRET_KEY, VigenereCodec
+from encryption_utils import CaesarCipher
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000, 100000)
+
+# كل نوع نصوص: (الوصف، دالة تعطي الرسالة رقم i، هل تُشفر قبل القياس)
+BATCH_WORKLOADS = {
+    'ascii': ("رسائل ASCII مشفرة", lambda i: f"See you at 10:30, message {i}!", True),
+    'mixed': ("رسائل عربية ولاتينية مشفرة",
+              lambda i: f"مرحبا يا صديقي، رسالة رقم {i} 👍 see you soon؟", True),
+    'arabic-plain': ("نص عربي غير مشفر (مرجع)",
+                     lambda i: f"مرحبا يا صديقي، كيف حالك اليوم؟ رسالة {i}", False),
+}
+
+VIGENERE_LENGTHS = (50, 500, 5000, 500000)
+
+VIGENERE_TEXTS = {
+    'ascii': "Meet me at the station at 10:30, bring the documents. ",
+    'mixed': "مرحبا يا صديقي، see you at 10:30 👍 كيف حالك؟ ",
+}
+
+
+def legacy_vigenere_encrypt(text, key):
+    """التنفيذ الأصلي لـ vigenere_encrypt قبل VigenereCodec (للمقارنة فقط)"""
+    encrypted = []
+    key = key.lower()
+    key_index = 0
+    for char in text:
+        if char.isalpha():
+            shift = ord(key[key_index % len(key)]) - ord('a')
+            if char.islower():
+                encrypted.append(chr((ord(char) - ord('a') + shift) % 26 + ord('a')))
+            else:
+                encrypted.append(chr((ord(char) - ord('A') + shift) % 26 + ord('A')))
+            key_index += 1
+        else:
+            encrypted.append(char)
+    return "".join(encrypted)
+
+
+def _best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_batches(sizes=BATCH_SIZES, workloads=tuple(BATCH_WORKLOADS), repeat=3,
+                      messages_per_run=100000):
+    """زمن فك التشفير لكل رسالة (نانوثانية) نصاً نصاً ومع decrypt_many
+
+    كل قياس يفك ``messages_per_run`` رسالة تقريباً (دفعات متكررة للأحجام
+    الصغيرة) ويؤخذ أفضل زمن من ``repeat`` محاولات. يعيد قاموساً
+    {(نوع النصوص، الحجم): (زمن نصاً نصاً، زمن الدفعة)}.
+    """
+    cipher = CaesarCipher()
+    results = {}
+    for workload in workloads:
+        _, make_text, encrypted = BATCH_WORKLOADS[workload]
+        for size in sizes:
+            texts = [make_text(i) for i in range(size)]
+            if encrypted:
+                texts = [cipher.encrypt(text) for text in texts]
+            rounds = max(1, messages_per_run // size)
+
+            def one_by_one():
+                for _ in range(rounds):
+                    [cipher.decrypt(text) for text in texts]
+
+            def batched():
+                for _ in range(rounds):
+                    cipher.decrypt_many(texts)
+
+            assert cipher.decrypt_many(texts) == [cipher.decrypt(text) for text in texts]
+            messages = rounds * size
+            results[workload, size] = (_best_time(one_by_one, repeat) / messages * 1e9,
+                                       _best_time(batched, repeat) / messages * 1e9)
+    return results
+
+
+def benchmark_vigenere(lengths=VIGENERE_LENGTHS, texts=tuple(VIGENERE_TEXTS), key=SECRET_KEY,
+                       repeat=3, chars_per_run=1000000):
+    """معدل تشفير فيجنير (مليون حرف في الثانية) بالتنفيذ الأصلي ومع VigenereCodec
+
+    كل قياس يشفر ``chars_per_run`` حرفاً تقريباً بنصوص طولها ``length`` ويؤخذ
+    أفضل زمن من ``repeat`` محاولات. يعيد قاموساً
+    {(نوع النص، الطول): (المعدل الأصلي، المعدل الجديد)}.
+    """
+    codec = VigenereCodec(key)
+    results = {}
+    for name in texts:
+        sample = VIGENERE_TEXTS[name]
+        for length in lengths:
+            text = (sample * (length // len(sample) + 1))[:length]
+            rounds = max(1, chars_per_run // length)
+            assert codec.encrypt(text) == legacy_vigenere_encrypt(text, key)
+
+            def legacy():
+                for _ in range(rounds):
+                    legacy_vigenere_encrypt(text, key)
+
+            def current():
+                for _ in range(rounds):
+                    codec.encrypt(text)
+
+            chars = rounds * length / 1e6
+            results[name, length] = (chars / _best_time(legacy, repeat),
+                                     chars / _best_time(current, repeat))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="قياس أداء التشفير")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = commands.add_parser("batch", help="فك التشفير نصاً نصاً مقابل الدفعات")
+    batch_parser.add_argument("--sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    batch_parser.add_argument("--workloads", nargs="+", choices=list(BATCH_WORKLOADS),
+                              default=list(BATCH_WORKLOADS))
+    batch_parser.add_argument("--repeat", type=int, default=3)
+
+    vigenere_parser = commands.add_parser("vigenere", help="فيجنير الأصلي مقابل VigenereCodec")
+    vigenere_parser.add_argument("--lengths", type=int, nargs="+", default=list(VIGENERE_LENGTHS))
+    vigenere_parser.add_argument("--texts", nargs="+", choices=list(VIGENERE_TEXTS),
+                                 default=list(VIGENERE_TEXTS))
+    vigenere_parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        results = benchmark_batches(args.sizes, args.workloads, args.repeat)
+        for (workload, size), (single, batch) in results.items():
+            print(f"{workload:>12} size={size:>6}: one-by-one {single:7,.0f} ns/msg, "
+                  f"decrypt_many {batch:7,.0f} ns/msg ({single / batch:4.1f}x)")
+    else:
+        results = benchmark_vigenere(args.lengths, args.texts, repeat=args.repeat)
+        for (name, length), (legacy, current) in results.items():
+            print(f"{name:>5} length={length:>7}: legacy {legacy:6.2f} Mchar/s, "
+                  f"VigenereCodec {current:6.2f} Mchar/s ({current / legacy:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
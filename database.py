@@ -1,90 +1,322 @@
 import sqlite3
 import secrets
+import base64
+from dataclasses import replace
 from datetime import datetime
 import json
 import os
+import time
+from db_pool import ConnectionPool
+from migrations import apply_migrations, check_query_plans
+from user_search import PrefixSearchCache, build_match_query, index_user
+from sharding import ShardRouter
+from profile_cache import ProfileCache
+from models import User, Conversation, Message, LazyRows, model_row_factory
+
+# الطول الأقصى لمقتطف آخر رسالة في قائمة المحادثات
+SNIPPET_LENGTH = 80
+
+# عدد المرشحين الذي يُخزن لكل بحث حتى يمكن تضييقه من الذاكرة
+SEARCH_CANDIDATE_LIMIT = 200
+
+def make_snippet(text, length=SNIPPET_LENGTH):
+    """اقتطاع نص الرسالة لعرضه كمقتطف"""
+    if text is None:
+        return None
+    text = " ".join(text.split())
+    if len(text) > length:
+        return text[:length - 1] + "…"
+    return text
+
+# تحديث ملخص المحادثة من صف الرسالة المدرجة (المعاملات: المقتطف، معرف الرسالة)
+SUMMARY_UPSERT_SQL = """
+    INSERT INTO conversation_summaries
+        (conversation_id, last_message_id, last_message_at, last_sender_id, snippet, seq)
+    SELECT conversation_id, id, created_at, sender_id, ?, seq
+    FROM messages WHERE id = ?
+    ON CONFLICT (conversation_id) DO UPDATE SET
+        last_message_id = excluded.last_message_id,
+        last_message_at = excluded.last_message_at,
+        last_sender_id = excluded.last_sender_id,
+        snippet = excluded.snippet,
+        seq = excluded.seq
+"""
+
+# إدراج رسالة برقم التسلسل التالي في محادثتها
+# (المعاملات: المعرف، المحادثة، المرسل، المحتوى، النوع)
+MESSAGE_INSERT_SQL = """
+    INSERT INTO messages (id, conversation_id, sender_id, content, message_type, seq)
+    VALUES (?1, ?2, ?3, ?4, ?5, (
+        SELECT COALESCE(MAX(seq), 0) + 1 FROM messages WHERE conversation_id = ?2
+    ))
+"""
+
+# إعادة ترقيم رسائل محادثة حسب ترتيبها الزمني (بعد دمج محادثات مكررة)
+SEQUENCE_RENUMBER_SQL = """
+    UPDATE messages SET seq = numbered.position
+    FROM (
+        SELECT rowid AS message_rowid,
+               ROW_NUMBER() OVER (ORDER BY created_at, rowid) AS position
+        FROM messages WHERE conversation_id = ?
+    ) AS numbered
+    WHERE messages.rowid = numbered.message_rowid
+"""
+
+# تقديم علامة قراءة المرسل إلى رسالته (المعامل: معرف الرسالة). العلامات تُخزن
+# مع الرسائل في جزء المحادثة ولا تتراجع أبداً
+READ_WATERMARK_SQL = """
+    INSERT INTO conversation_reads
+        (conversation_id, user_id, last_read_seq, last_read_message_id, last_read_at)
+    SELECT conversation_id, sender_id, seq, id, created_at
+    FROM messages WHERE id = ?
+    ON CONFLICT (conversation_id, user_id) DO UPDATE SET
+        last_read_seq = excluded.last_read_seq,
+        last_read_message_id = excluded.last_read_message_id,
+        last_read_at = excluded.last_read_at
+    WHERE excluded.last_read_seq > conversation_reads.last_read_seq
+"""
+
+# تقديم علامة قراءة مستخدم إلى آخر رسالة في الملخص (المعاملات: المستخدم، المحادثة)
+MARK_READ_SQL = """
+    INSERT INTO conversation_reads
+        (conversation_id, user_id, last_read_seq, last_read_message_id, last_read_at)
+    SELECT conversation_id, ?, seq, last_message_id, last_message_at
+    FROM conversation_summaries WHERE conversation_id = ?
+    ON CONFLICT (conversation_id, user_id) DO UPDATE SET
+        last_read_seq = excluded.last_read_seq,
+        last_read_message_id = excluded.last_read_message_id,
+        last_read_at = excluded.last_read_at
+    WHERE excluded.last_read_seq > conversation_reads.last_read_seq
+"""
+
+def encode_message_cursor(created_at, row_id):
+    """ترميز مؤشر رسالة (وقت الإنشاء + رقم الصف) كنص معتم"""
+    raw = f"{created_at}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_message_cursor(cursor):
+    """فك ترميز مؤشر رسالة"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').rsplit('|', 1)
+        return created_at, int(row_id)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid message cursor: {cursor!r}") from e
+
+def private_pair_key(user1_id, user2_id):
+    """المفتاح الموحد لمحادثة خاصة بين مستخدمين (لا يعتمد على الترتيب)"""
+    return f"{min(user1_id, user2_id)}:{max(user1_id, user2_id)}"
 
 class DatabaseManager:
     """إدارة قاعدة البيانات"""
     
-    def __init__(self, db_path="secure_chat.db"):
+    def __init__(self, db_path="secure_chat.db", pool_size=None, shard_count=None, on_connect=None,
+                 allow_main_messages=False):
         self.db_path = db_path
+        # يُستخدم فقط أثناء إعادة التوزيع (sharding.rebalance) لفتح التوزيع الهدف
+        self.allow_main_messages = allow_main_messages
+        if pool_size is None:
+            pool_size = self._get_default_pool_size()
+        if shard_count is None:
+            shard_count = self._get_default_shard_count()
+        
+        def make_pool(path):
+            return ConnectionPool(path, max_size=pool_size, on_connect=on_connect)
+        
+        self.pool = make_pool(db_path)
+        # الرسائل وملخصات المحادثات تُقسم على عدة ملفات عند تفعيل DB_SHARDS
+        self.shards = ShardRouter(db_path, shard_count, make_pool) if shard_count > 0 else None
+        self.search_cache = PrefixSearchCache()
+        self.profile_cache = ProfileCache()
+        self.startup_stats = {}
         self.init_database()
     
+    def _get_default_pool_size(self):
+        """الحصول على حجم مجمع الاتصالات من متغيرات البيئة أو قيمة افتراضية"""
+        try:
+            size = int(os.getenv("DB_POOL_SIZE", "8"))
+            return size if size > 0 else 8
+        except ValueError:
+            return 8
+    
+    def _get_default_shard_count(self):
+        """عدد أجزاء تخزين الرسائل من متغيرات البيئة (0 = بدون تقسيم)"""
+        try:
+            count = int(os.getenv("DB_SHARDS", "0"))
+            return count if count > 0 else 0
+        except ValueError:
+            return 0
+    
+    def get_pool_stats(self):
+        """الحصول على إحصائيات مجمع الاتصالات"""
+        stats = self.pool.get_stats()
+        if self.shards is not None:
+            stats['shards'] = self.shards.get_stats()
+        return stats
+    
+    def get_search_cache_stats(self):
+        """الحصول على إحصائيات ذاكرة البحث المؤقتة"""
+        return self.search_cache.get_stats()
+    
+    def get_profile_cache_stats(self):
+        """الحصول على إحصائيات ذاكرة ملفات المستخدمين المؤقتة"""
+        return self.profile_cache.get_stats()
+    
     def init_database(self):
-        """تهيئة قاعدة البيانات وإنشاء الجداول"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # جدول المستخدمين
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id TEXT PRIMARY KEY,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    display_name TEXT NOT NULL,
-                    avatar TEXT,
-                    is_online BOOLEAN DEFAULT FALSE,
-                    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # جدول الصداقات
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS friendships (
-                    id TEXT PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    friend_id TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (friend_id) REFERENCES users (id)
-                )
-            """)
-            
-            # جدول المحادثات
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id TEXT PRIMARY KEY,
-                    type TEXT DEFAULT 'private',
-                    name TEXT,
-                    avatar TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+        """تهيئة قاعدة البيانات وتطبيق ترحيلات المخطط
+        
+        إذا كان إصدار المخطط المخزن هو الأحدث لا يُنفذ أي تعديل، لذلك يبقى
+        زمن بدء التشغيل ثابتاً مهما كبر حجم قاعدة البيانات.
+        """
+        start = time.perf_counter()
+        pools = [self.pool] + (self.shards.pools if self.shards is not None else [])
+        applied = []
+        for pool in pools:
+            with pool.connection() as conn:
+                applied.extend(apply_migrations(conn))
+        self._check_shard_layout()
+        self._move_merged_messages()
+        self._move_read_state()
+        self.startup_stats = {
+            'schema_init_ms': (time.perf_counter() - start) * 1000,
+            'migrations_applied': applied,
+        }
+    
+    def _check_shard_layout(self):
+        """رفض التشغيل المقسم إذا كان الملف الرئيسي ما زال يحتوي رسائل
+        
+        هذه الرسائل لن تُقرأ من الأجزاء، ونقل المحادثات المدمجة لن يجدها، لذلك
+        يجب تشغيل ``python sharding.py rebalance --from 0 --to N`` أولاً.
+        """
+        if self.shards is None or self.allow_main_messages:
+            return
+        with self.pool.connection() as conn:
+            has_messages = conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone() is not None
+        if has_messages:
+            self.close()
+            raise RuntimeError(
+                f"{self.db_path} still stores messages but DB_SHARDS={self.shards.shard_count}; "
+                f"run: python sharding.py rebalance --db {self.db_path} "
+                f"--from 0 --to {self.shards.shard_count}"
+            )
+    
+    def _move_merged_messages(self):
+        """نقل رسائل وملخصات المحادثات المكررة المدمجة إلى المحادثة الأساسية
+        
+        الدمج نفسه يتم في ترحيل قاعدة البيانات الرئيسية، لكن الرسائل قد تكون في
+        ملفات الأجزاء لذلك تُنقل هنا. في وضع التقسيم يُفحص جزء المكررة والملف
+        الرئيسي معاً (قاعدة لم يُعد توزيعها بعد)، ولا يُعلَّم الدمج منتهياً إلا
+        بعد النقل من كليهما. كل خطوة قابلة للتكرار بأمان.
+        """
+        with self.pool.connection() as conn:
+            merges = conn.execute("""
+                SELECT duplicate_id, canonical_id FROM conversation_merges
+                WHERE messages_moved = 0
+            """).fetchall()
+        
+        for duplicate_id, canonical_id in merges:
+            target = self._message_pool(canonical_id)
+            sources = [self._message_pool(duplicate_id)]
+            if self.pool not in sources:
+                sources.append(self.pool)
             
-            # جدول مشاركي المحادثة
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS conversation_participants (
-                    id TEXT PRIMARY KEY,
-                    conversation_id TEXT NOT NULL,
-                    user_id TEXT NOT NULL,
-                    role TEXT DEFAULT 'member',
-                    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations (id),
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
+            for source in sources:
+                self._move_merged_conversation(source, target, duplicate_id, canonical_id)
             
-            # جدول الرسائل
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id TEXT PRIMARY KEY,
-                    conversation_id TEXT NOT NULL,
-                    sender_id TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    message_type TEXT DEFAULT 'text',
-                    is_read BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations (id),
-                    FOREIGN KEY (sender_id) REFERENCES users (id)
-                )
-            """)
-            
-            conn.commit()
+            with self.pool.connection(write=True) as conn:
+                conn.execute("UPDATE conversation_merges SET messages_moved = 1 WHERE duplicate_id = ?",
+                             (duplicate_id,))
+    
+    def _move_merged_conversation(self, source, target, duplicate_id, canonical_id):
+        """نقل رسائل وملخص محادثة مكررة من مجمع ``source`` إلى المحادثة الأساسية"""
+        with source.connection() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(messages)")]
+            position = columns.index('conversation_id')
+            messages = [
+                row[:position] + (canonical_id,) + row[position + 1:]
+                for row in conn.execute("SELECT * FROM messages WHERE conversation_id = ?",
+                                        (duplicate_id,))
+            ]
+            summary = conn.execute("""
+                SELECT last_message_id, last_message_at, last_sender_id, snippet
+                FROM conversation_summaries WHERE conversation_id = ?
+            """, (duplicate_id,)).fetchone()
+        
+        if messages or summary is not None:
+            with target.connection(write=True) as conn:
+                if source is target:
+                    conn.execute("UPDATE messages SET conversation_id = ? WHERE conversation_id = ?",
+                                 (canonical_id, duplicate_id))
+                elif messages:
+                    conn.executemany(f"""
+                        INSERT OR IGNORE INTO messages ({", ".join(columns)})
+                        VALUES ({", ".join("?" for _ in columns)})
+                    """, messages)
+                if summary is not None:
+                    # الإبقاء على أحدث رسالة بين المحادثتين
+                    conn.execute("""
+                        INSERT INTO conversation_summaries
+                            (conversation_id, last_message_id, last_message_at, last_sender_id, snippet)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (conversation_id) DO UPDATE SET
+                            last_message_id = excluded.last_message_id,
+                            last_message_at = excluded.last_message_at,
+                            last_sender_id = excluded.last_sender_id,
+                            snippet = excluded.snippet
+                        WHERE excluded.last_message_at > COALESCE(conversation_summaries.last_message_at, '')
+                    """, (canonical_id,) + tuple(summary))
+                
+                conn.execute(SEQUENCE_RENUMBER_SQL, (canonical_id,))
+                conn.execute("""
+                    UPDATE conversation_summaries SET seq = (
+                        SELECT COALESCE(MAX(seq), 0) FROM messages WHERE conversation_id = ?
+                    )
+                    WHERE conversation_id = ?
+                """, (canonical_id, canonical_id))
+        
+        with source.connection(write=True) as conn:
+            conn.execute("DELETE FROM messages WHERE conversation_id = ?", (duplicate_id,))
+            conn.execute("DELETE FROM conversation_summaries WHERE conversation_id = ?",
+                         (duplicate_id,))
+            conn.execute("DELETE FROM conversation_reads WHERE conversation_id = ?",
+                         (duplicate_id,))
+    
+    def _move_read_state(self):
+        """نقل علامات القراءة من conversation_participants إلى conversation_reads
+        
+        علامة كل مشارك تصبح رقم تسلسل: رقم آخر رسالة في المحادثة ناقص عداد غير
+        المقروء المخزن. يتم مرة واحدة (مفتاح read_state_moved في app_settings)
+        وكل خطوة قابلة للتكرار بأمان.
+        """
+        with self.pool.connection() as conn:
+            if conn.execute("SELECT 1 FROM app_settings WHERE key = 'read_state_moved'").fetchone():
+                return
+            participants = conn.execute("""
+                SELECT conversation_id, user_id, unread_count, last_read_message_id, last_read_at
+                FROM conversation_participants
+            """).fetchall()
+        
+        groups = {}
+        for row in participants:
+            groups.setdefault(self._message_pool(row[0]), []).append(row)
+        
+        for pool, rows in groups.items():
+            with pool.connection(write=True) as conn:
+                conn.executemany("""
+                    INSERT INTO conversation_reads
+                        (conversation_id, user_id, last_read_seq, last_read_message_id, last_read_at)
+                    VALUES (?1, ?2, MAX(COALESCE((
+                        SELECT seq FROM conversation_summaries WHERE conversation_id = ?1
+                    ), 0) - ?3, 0), ?4, ?5)
+                    ON CONFLICT (conversation_id, user_id) DO NOTHING
+                """, rows)
+        
+        self.get_or_create_setting('read_state_moved', '1')
+    
+    def check_query_plans(self):
+        """التحقق من خطط تنفيذ الاستعلامات الرئيسية"""
+        with self.pool.connection() as conn:
+            return check_query_plans(conn)
     
     def generate_id(self):
         """توليد معرف فريد"""
@@ -95,172 +327,231 @@ class DatabaseManager:
         """إنشاء مستخدم جديد"""
         user_id = self.generate_id()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.connection(write=True) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO users (id, username, email, password_hash, display_name)
                     VALUES (?, ?, ?, ?, ?)
                 """, (user_id, username, email, password_hash, display_name))
-                conn.commit()
-                return user_id
+                index_user(conn, cursor.lastrowid, username, email, display_name)
         except sqlite3.IntegrityError:
             return None
+        self.search_cache.invalidate()
+        return user_id
     
-    def get_user_by_username(self, username):
-        """البحث عن مستخدم بواسطة اسم المستخدم"""
-        with sqlite3.connect(self.db_path) as conn:
+    def _get_user(self, column, value):
+        """البحث عن مستخدم واحد بعمود فريد (id أو username أو email)
+        
+        النتيجة بدون password_hash لأنها قد تأتي من الذاكرة المؤقتة، والتحقق من
+        كلمة المرور يقرأ التجزئة من قاعدة البيانات عبر ``get_password_hash``.
+        """
+        user = self.profile_cache.get(column, value)
+        if user is not None:
+            return user
+        
+        generation = self.profile_cache.generation
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, username, email, password_hash, display_name, avatar, 
+            cursor.row_factory = model_row_factory(User)
+            cursor.execute(f"""
+                SELECT id, username, email, display_name, NULL AS password_hash, avatar,
                        is_online, last_seen, created_at
-                FROM users WHERE username = ?
-            """, (username,))
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'id': row[0], 'username': row[1], 'email': row[2],
-                    'password_hash': row[3], 'display_name': row[4], 'avatar': row[5],
-                    'is_online': row[6], 'last_seen': row[7], 'created_at': row[8]
-                }
-            return None
+                FROM users WHERE {column} = ?
+            """, (value,))
+            user = cursor.fetchone()
+        
+        if user is not None:
+            self.profile_cache.put(user, generation)
+        return user
+    
+    def get_user_by_username(self, username):
+        """البحث عن مستخدم بواسطة اسم المستخدم"""
+        return self._get_user("username", username)
     
     def get_user_by_email(self, email):
         """البحث عن مستخدم بواسطة البريد الإلكتروني"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, username, email, password_hash, display_name, avatar,
-                       is_online, last_seen, created_at
-                FROM users WHERE email = ?
-            """, (email,))
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'id': row[0], 'username': row[1], 'email': row[2],
-                    'password_hash': row[3], 'display_name': row[4], 'avatar': row[5],
-                    'is_online': row[6], 'last_seen': row[7], 'created_at': row[8]
-                }
-            return None
+        return self._get_user("email", email)
     
     def get_user_by_id(self, user_id):
         """البحث عن مستخدم بواسطة المعرف"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, username, email, password_hash, display_name, avatar,
-                       is_online, last_seen, created_at
-                FROM users WHERE id = ?
-            """, (user_id,))
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'id': row[0], 'username': row[1], 'email': row[2],
-                    'password_hash': row[3], 'display_name': row[4], 'avatar': row[5],
-                    'is_online': row[6], 'last_seen': row[7], 'created_at': row[8]
-                }
-            return None
+        return self._get_user("id", user_id)
     
     def update_user_online_status(self, user_id, is_online):
         """تحديث حالة الاتصال للمستخدم"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection(write=True) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE users SET is_online = ?, last_seen = CURRENT_TIMESTAMP
                 WHERE id = ?
             """, (is_online, user_id))
-            conn.commit()
+        self.profile_cache.invalidate([user_id])
     
-    def search_users(self, query, exclude_user_id):
-        """البحث عن المستخدمين"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, username, email, display_name, avatar, is_online, last_seen
-                FROM users 
-                WHERE (username LIKE ? OR email LIKE ? OR display_name LIKE ?)
-                AND id != ?
-                LIMIT 20
-            """, (f"%{query}%", f"%{query}%", f"%{query}%", exclude_user_id))
+    def update_users_presence(self, updates):
+        """كتابة حالة اتصال عدة مستخدمين في معاملة واحدة
+        
+        ``updates`` عناصر من الشكل (is_online, last_seen, user_id).
+        """
+        with self.pool.connection(write=True) as conn:
+            conn.executemany("""
+                UPDATE users SET is_online = ?, last_seen = ?
+                WHERE id = ?
+            """, updates)
+        self.profile_cache.invalidate([user_id for _, _, user_id in updates])
+    
+    def search_users(self, query, exclude_user_id, limit=20):
+        """البحث عن المستخدمين بمطابقة بداية الكلمات في الاسم أو البريد"""
+        rows = self.search_cache.get(query, exclude_user_id)
+        if rows is None:
+            match_query = build_match_query(query)
+            if match_query is None:
+                return []
             
-            users = []
-            for row in cursor.fetchall():
-                users.append({
-                    'id': row[0], 'username': row[1], 'email': row[2],
-                    'display_name': row[3], 'avatar': row[4], 'is_online': row[5],
-                    'last_seen': row[6]
-                })
-            return users
+            generation = self.search_cache.generation
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = model_row_factory(User)
+                cursor.execute("""
+                    SELECT u.id, u.username, u.email, u.display_name, u.avatar, u.is_online, u.last_seen
+                    FROM users_fts
+                    INNER JOIN users u ON u.rowid = users_fts.rowid
+                    WHERE users_fts MATCH ? AND u.id != ?
+                    ORDER BY bm25(users_fts, 3.0, 1.0, 2.0)
+                    LIMIT ?
+                """, (match_query, exclude_user_id, SEARCH_CANDIDATE_LIMIT))
+                rows = cursor.fetchall()
+            
+            complete = len(rows) < SEARCH_CANDIDATE_LIMIT
+            self.search_cache.put(query, exclude_user_id, rows, complete, generation)
+        
+        # نسخ حتى لا يؤثر تعديل النتائج على الذاكرة المؤقتة
+        return [replace(row) for row in rows[:limit]]
     
     def update_user_profile(self, user_id, display_name, email):
         """تحديث ملف المستخدم"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.connection(write=True) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     UPDATE users SET display_name = ?, email = ?
                     WHERE id = ?
                 """, (display_name, email, user_id))
-                conn.commit()
-                return True
+                row = cursor.execute("SELECT rowid, username FROM users WHERE id = ?", (user_id,)).fetchone()
+                if row is not None:
+                    index_user(conn, row[0], row[1], email, display_name)
         except sqlite3.IntegrityError:
             return False
+        self.search_cache.invalidate()
+        self.profile_cache.invalidate([user_id])
+        return True
+    
+    def get_password_hash(self, user_id):
+        """تجزئة كلمة مرور المستخدم من قاعدة البيانات مباشرة (بدون الذاكرة المؤقتة)
+        
+        كلمة المرور قد تتغير في عملية أخرى، لذلك لا تُخزن التجزئة مؤقتاً.
+        """
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT password_hash FROM users WHERE id = ?",
+                               (user_id,)).fetchone()
+            return row[0] if row else None
     
     def update_user_password(self, user_id, new_password_hash):
         """تحديث كلمة مرور المستخدم"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection(write=True) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE users SET password_hash = ?
                 WHERE id = ?
             """, (new_password_hash, user_id))
-            conn.commit()
+        self.profile_cache.invalidate([user_id])
+    
+    # إدارة الجلسات
+    def get_or_create_setting(self, key, default):
+        """قراءة إعداد مخزن، أو تخزين ``default`` إذا لم يكن موجوداً"""
+        with self.pool.connection(write=True) as conn:
+            conn.execute("""
+                INSERT INTO app_settings (key, value) VALUES (?, ?)
+                ON CONFLICT (key) DO NOTHING
+            """, (key, default))
+            return conn.execute("SELECT value FROM app_settings WHERE key = ?", (key,)).fetchone()[0]
+    
+    def create_session(self, session_id, user_id, expires_at):
+        """تسجيل جلسة جديدة مع حذف الجلسات المنتهية لنفس المستخدم"""
+        with self.pool.connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM sessions WHERE user_id = ? AND expires_at <= CAST(strftime('%s', 'now') AS INTEGER)
+            """, (user_id,))
+            cursor.execute("""
+                INSERT INTO sessions (id, user_id, expires_at)
+                VALUES (?, ?, ?)
+            """, (session_id, user_id, expires_at))
+    
+    def get_session(self, session_id):
+        """الحصول على جلسة: (user_id, expires_at) أو None"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT user_id, expires_at FROM sessions WHERE id = ?", (session_id,))
+            return cursor.fetchone()
+    
+    def delete_session(self, session_id):
+        """إلغاء جلسة واحدة"""
+        with self.pool.connection(write=True) as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+    
+    def delete_user_sessions(self, user_id):
+        """إلغاء جميع جلسات المستخدم"""
+        with self.pool.connection(write=True) as conn:
+            return conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,)).rowcount
     
     # إدارة الصداقات
     def create_friendship(self, user_id, friend_id):
-        """إنشاء طلب صداقة"""
+        """إنشاء صداقة (تُخزن في الاتجاهين)"""
         friendship_id = self.generate_id()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.connection(write=True) as conn:
                 cursor = conn.cursor()
-                
-                # التحقق من عدم وجود طلب صداقة موجود
                 cursor.execute("""
-                    SELECT id FROM friendships 
-                    WHERE (user_id = ? AND friend_id = ?) OR (user_id = ? AND friend_id = ?)
-                """, (user_id, friend_id, friend_id, user_id))
-                
-                if cursor.fetchone():
+                    INSERT INTO friendships (id, user_id, friend_id, status)
+                    VALUES (?, ?, ?, 'accepted')
+                    ON CONFLICT (user_id, friend_id) DO NOTHING
+                """, (friendship_id, user_id, friend_id))
+                if cursor.rowcount == 0:
                     return None  # يوجد طلب صداقة بالفعل
                 
                 cursor.execute("""
                     INSERT INTO friendships (id, user_id, friend_id, status)
                     VALUES (?, ?, ?, 'accepted')
-                """, (friendship_id, user_id, friend_id))
-                conn.commit()
+                    ON CONFLICT (user_id, friend_id) DO NOTHING
+                """, (self.generate_id(), friend_id, user_id))
                 return friendship_id
         except sqlite3.IntegrityError:
             return None
     
     def get_user_friends(self, user_id):
         """الحصول على قائمة أصدقاء المستخدم"""
-        with sqlite3.connect(self.db_path) as conn:
+        return self.get_users_friends([user_id]).get(user_id, [])
+    
+    def get_users_friends(self, user_ids):
+        """الحصول على قوائم أصدقاء عدة مستخدمين باستعلام واحد: user_id -> [User]"""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT u.id, u.username, u.display_name, u.avatar, u.is_online, u.last_seen
-                FROM users u
-                INNER JOIN friendships f ON (
-                    (f.user_id = ? AND f.friend_id = u.id) OR
-                    (f.friend_id = ? AND f.user_id = u.id)
-                )
-                WHERE f.status = 'accepted' AND u.id != ?
-            """, (user_id, user_id, user_id))
+            cursor.execute(f"""
+                SELECT f.user_id, u.id, u.username, u.display_name, u.avatar, u.is_online, u.last_seen
+                FROM friendships f
+                INNER JOIN users u ON u.id = f.friend_id
+                WHERE f.user_id IN ({", ".join("?" for _ in user_ids)})
+                AND f.status = 'accepted' AND f.friend_id != f.user_id
+            """, user_ids)
             
-            friends = []
+            friends = {user_id: [] for user_id in user_ids}
             for row in cursor.fetchall():
-                friends.append({
-                    'id': row[0], 'username': row[1], 'display_name': row[2],
-                    'avatar': row[3], 'is_online': row[4], 'last_seen': row[5]
-                })
+                friends[row[0]].append(User(
+                    id=row[1], username=row[2], display_name=row[3], avatar=row[4],
+                    is_online=row[5], last_seen=row[6]
+                ))
             return friends
     
     # إدارة المحادثات
@@ -268,142 +559,458 @@ class DatabaseManager:
         """إنشاء محادثة جديدة"""
         conversation_id = self.generate_id()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.connection(write=True) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO conversations (id, type, name)
                     VALUES (?, ?, ?)
                 """, (conversation_id, conversation_type, name))
-                conn.commit()
                 return conversation_id
         except Exception as e:
             print(f"Error creating conversation: {e}")
             return None
     
     def add_conversation_participant(self, conversation_id, user_id, role='member'):
-        """إضافة مشارك للمحادثة"""
+        """إضافة مشارك للمحادثة (الرسائل السابقة لانضمامه تعتبر مقروءة)"""
         participant_id = self.generate_id()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.connection(write=True) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO conversation_participants (id, conversation_id, user_id, role)
                     VALUES (?, ?, ?, ?)
                 """, (participant_id, conversation_id, user_id, role))
-                conn.commit()
-                return participant_id
+            self.mark_conversation_as_read(conversation_id, user_id)
+            return participant_id
         except Exception as e:
             print(f"Error adding participant: {e}")
             return None
     
+    def get_conversation_participant_ids(self, conversation_id):
+        """معرفات مشاركي المحادثة"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT user_id FROM conversation_participants
+                WHERE conversation_id = ?
+            """, (conversation_id,))
+            return [row[0] for row in cursor.fetchall()]
+    
     def get_user_conversations(self, user_id):
-        """الحصول على محادثات المستخدم"""
-        with sqlite3.connect(self.db_path) as conn:
+        """الحصول على محادثات المستخدم مرتبة حسب آخر نشاط"""
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT DISTINCT c.id, c.type, c.name, c.created_at,
-                       (SELECT content FROM messages m WHERE m.conversation_id = c.id ORDER BY m.created_at DESC LIMIT 1) as last_message,
-                       (SELECT u.display_name FROM users u 
-                        INNER JOIN conversation_participants cp ON cp.user_id = u.id 
-                        WHERE cp.conversation_id = c.id AND u.id != ? LIMIT 1) as other_user_name
-                FROM conversations c
-                INNER JOIN conversation_participants cp ON cp.conversation_id = c.id
+                SELECT c.id, c.type, c.name, c.created_at,
+                       s.snippet, s.last_message_id, s.last_message_at, s.last_sender_id,
+                       u.display_name,
+                       MAX(COALESCE(s.seq, 0) - COALESCE(r.last_read_seq, 0), 0),
+                       c.updated_at
+                FROM conversation_participants cp
+                INNER JOIN conversations c ON c.id = cp.conversation_id
+                LEFT JOIN conversation_summaries s ON s.conversation_id = c.id
+                LEFT JOIN conversation_reads r
+                       ON r.conversation_id = c.id AND r.user_id = cp.user_id
+                LEFT JOIN conversation_participants op
+                       ON op.conversation_id = c.id AND op.user_id != cp.user_id
+                LEFT JOIN users u ON u.id = op.user_id
                 WHERE cp.user_id = ?
-                ORDER BY c.updated_at DESC
-            """, (user_id, user_id))
-            
-            conversations = []
-            for row in cursor.fetchall():
-                conv_name = row[2] if row[2] else row[5] if row[5] else "محادثة"
-                conversations.append({
-                    'id': row[0],
-                    'type': row[1],
-                    'name': conv_name,
-                    'created_at': row[3],
-                    'last_message': row[4] if row[4] else 'لا توجد رسائل'
-                })
-            return conversations
+                GROUP BY c.id
+                ORDER BY COALESCE(s.last_message_at, c.updated_at) DESC
+            """, (user_id,))
+            rows = cursor.fetchall()
+        
+        if self.shards is not None:
+            rows = self._merge_shard_summaries(rows, user_id)
+        
+        conversations = []
+        for row in rows:
+            conv_name = row[2] if row[2] else row[8] if row[8] else "محادثة"
+            if row[5] is None:
+                last_message = 'لا توجد رسائل'
+            else:
+                last_message = row[4] if row[4] is not None else '🔐 رسالة مشفرة'
+            conversations.append(Conversation(
+                id=row[0],
+                type=row[1],
+                name=conv_name,
+                created_at=row[3],
+                updated_at=row[10],
+                last_message=last_message,
+                last_message_id=row[5],
+                last_message_at=row[6],
+                last_sender_id=row[7],
+                unread_count=row[9]
+            ))
+        return conversations
+    
+    def _merge_shard_summaries(self, rows, user_id):
+        """إكمال صفوف قائمة المحادثات بالملخصات وعدادات غير المقروء المخزنة في
+        الأجزاء وإعادة ترتيبها"""
+        summaries = {}
+        for pool, conversation_ids in self.shards.group_by_shard([row[0] for row in rows]).items():
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT s.conversation_id, s.snippet, s.last_message_id, s.last_message_at,
+                           s.last_sender_id, MAX(s.seq - COALESCE(r.last_read_seq, 0), 0)
+                    FROM conversation_summaries s
+                    LEFT JOIN conversation_reads r
+                           ON r.conversation_id = s.conversation_id AND r.user_id = ?
+                    WHERE s.conversation_id IN ({", ".join("?" for _ in conversation_ids)})
+                """, [user_id] + conversation_ids)
+                for row in cursor.fetchall():
+                    summaries[row[0]] = row[1:]
+        
+        merged = []
+        for row in rows:
+            summary = summaries.get(row[0], (None, None, None, None, 0))
+            merged.append(row[:4] + summary[:4] + (row[8], summary[4]) + row[10:])
+        merged.sort(key=lambda row: row[6] or row[10] or '', reverse=True)
+        return merged
+    
+    def _private_conversation(self, row, other_user_id):
+        """بناء كائن المحادثة الخاصة باسم المستخدم الآخر"""
+        other_user = self.get_user_by_id(other_user_id)
+        conv_name = other_user['display_name'] if other_user else "محادثة خاصة"
+        return Conversation(id=row[0], type=row[1], name=conv_name, created_at=row[2])
     
     def find_private_conversation(self, user1_id, user2_id):
-        """البحث عن محادثة خاصة بين مستخدمين"""
-        with sqlite3.connect(self.db_path) as conn:
+        """البحث عن محادثة خاصة بين مستخدمين عبر مفتاح الزوج"""
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT c.id, c.type, c.name, c.created_at
-                FROM conversations c
-                WHERE c.type = 'private'
-                AND c.id IN (
-                    SELECT cp1.conversation_id FROM conversation_participants cp1
-                    WHERE cp1.user_id = ?
-                )
-                AND c.id IN (
-                    SELECT cp2.conversation_id FROM conversation_participants cp2
-                    WHERE cp2.user_id = ?
-                )
-            """, (user1_id, user2_id))
-            
+                SELECT id, type, created_at FROM conversations
+                WHERE pair_key = ?
+            """, (private_pair_key(user1_id, user2_id),))
             row = cursor.fetchone()
-            if row:
-                # الحصول على اسم المستخدم الآخر
-                other_user = self.get_user_by_id(user2_id)
-                conv_name = other_user['display_name'] if other_user else "محادثة خاصة"
-                
-                return {
-                    'id': row[0],
-                    'type': row[1],
-                    'name': conv_name,
-                    'created_at': row[3]
-                }
-            return None
+        
+        if row:
+            return self._private_conversation(row, user2_id)
+        return None
+    
+    def get_or_create_private_conversation(self, user1_id, user2_id):
+        """الحصول على المحادثة الخاصة بين مستخدمين أو إنشاؤها
+        
+        الإنشاء يتم في معاملة واحدة مع INSERT ... ON CONFLICT على مفتاح الزوج،
+        لذلك لا ينتج عن طلبين متزامنين محادثتان مكررتان.
+        """
+        conversation = self.find_private_conversation(user1_id, user2_id)
+        if conversation is not None:
+            return conversation
+        
+        pair_key = private_pair_key(user1_id, user2_id)
+        with self.pool.connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO conversations (id, type, pair_key)
+                VALUES (?, 'private', ?)
+                ON CONFLICT (pair_key) WHERE pair_key IS NOT NULL DO NOTHING
+            """, (self.generate_id(), pair_key))
+            created = cursor.rowcount == 1
+            
+            row = cursor.execute("""
+                SELECT id, type, created_at FROM conversations
+                WHERE pair_key = ?
+            """, (pair_key,)).fetchone()
+            
+            # المحادثة التي أنشأها طلب متزامن تحتوي مشاركيها بالفعل
+            if created:
+                participants = [(user1_id, 'admin')]
+                if user2_id != user1_id:
+                    participants.append((user2_id, 'member'))
+                cursor.executemany("""
+                    INSERT INTO conversation_participants (id, conversation_id, user_id, role)
+                    VALUES (?, ?, ?, ?)
+                """, [(self.generate_id(), row[0], user_id, role) for user_id, role in participants])
+        
+        return self._private_conversation(row, user2_id)
     
     # إدارة الرسائل
-    def create_message(self, conversation_id, sender_id, content, message_type='text'):
-        """إنشاء رسالة جديدة"""
+    def _message_pool(self, conversation_id):
+        """مجمع الاتصالات الذي يخزن رسائل المحادثة (الجزء أو القاعدة الرئيسية)"""
+        if self.shards is None:
+            return self.pool
+        return self.shards.for_conversation(conversation_id)
+    
+    def create_message(self, conversation_id, sender_id, content, message_type='text', snippet=None):
+        """إنشاء رسالة جديدة وتحديث ملخص المحادثة في نفس المعاملة
+        
+        ``snippet`` هو النص المفكوك الذي يظهر في قائمة المحادثات، ويتم قصه
+        إلى SNIPPET_LENGTH حرفاً. الرسالة والملخص وعلامة قراءة المرسل تُكتب في
+        جزء المحادثة فقط، ولا تُكتب القاعدة الرئيسية لكل رسالة، لذلك تتوازى
+        عمليات الإرسال بين الأجزاء.
+        """
         message_id = self.generate_id()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._message_pool(conversation_id).connection(write=True) as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO messages (id, conversation_id, sender_id, content, message_type)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (message_id, conversation_id, sender_id, content, message_type))
+                cursor.execute(MESSAGE_INSERT_SQL,
+                               (message_id, conversation_id, sender_id, content, message_type))
                 
-                # تحديث وقت آخر نشاط للمحادثة
-                cursor.execute("""
-                    UPDATE conversations SET updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (conversation_id,))
+                self._update_conversation_summary(cursor, message_id, make_snippet(snippet))
                 
-                conn.commit()
-                return message_id
+                # المرسل قرأ المحادثة حتى رسالته
+                cursor.execute(READ_WATERMARK_SQL, (message_id,))
         except Exception as e:
             print(f"Error creating message: {e}")
             return None
+        
+        return message_id
+    
+    def _update_conversation_summary(self, cursor, message_id, snippet):
+        """تحديث ملخص المحادثة بآخر رسالة (يُستدعى داخل معاملة الكتابة)"""
+        cursor.execute(SUMMARY_UPSERT_SQL, (snippet, message_id))
+    
+    def create_messages_bulk(self, messages, message_type='text', snippet_for=None):
+        """إدراج دفعة رسائل في معاملة واحدة
+        
+        ``messages`` عناصر من الشكل (conversation_id, sender_id, content). يتم
+        تحديث الملخص مرة واحدة لكل محادثة متأثرة باستخدام آخر رسالة
+        فيها، و``snippet_for`` دالة اختيارية تحول محتوى تلك الرسالة إلى مقتطف.
+        يعيد قائمة معرفات الرسائل بنفس ترتيب الإدخال. في وضع التقسيم تكون هناك
+        معاملة واحدة لكل جزء متأثر، وإذا فشلت إحداها تبقى الأجزاء الأخرى مؤكدة
+        ويكون المعرف None لرسائل الجزء الفاشل فقط.
+        """
+        rows = []
+        last_message = {}
+        sender_last = {}   # (conversation_id, sender_id) -> معرف آخر رسالة له
+        for conversation_id, sender_id, content in messages:
+            message_id = self.generate_id()
+            rows.append((message_id, conversation_id, sender_id, content, message_type))
+            last_message[conversation_id] = (message_id, content)
+            sender_last[(conversation_id, sender_id)] = message_id
+        
+        if not rows:
+            return []
+        
+        groups = {}
+        for row in rows:
+            groups.setdefault(self._message_pool(row[1]), []).append(row)
+        
+        failed = set()
+        for pool, group in groups.items():
+            try:
+                self._insert_message_group(pool, group, last_message, sender_last, snippet_for)
+            except Exception as e:
+                print(f"Error creating messages in bulk ({pool.db_path}): {e}")
+                failed.update(row[0] for row in group)
+        
+        return [None if row[0] in failed else row[0] for row in rows]
+    
+    def _insert_message_group(self, pool, rows, last_message, sender_last, snippet_for):
+        """إدراج رسائل محادثات جزء واحد مع تحديث الملخصات وعلامات قراءة المرسلين"""
+        conversation_ids = {row[1] for row in rows}
+        
+        summaries = []
+        for conversation_id in conversation_ids:
+            message_id, content = last_message[conversation_id]
+            snippet = snippet_for(content) if snippet_for else None
+            summaries.append((make_snippet(snippet), message_id))
+        
+        watermarks = [
+            (message_id,)
+            for (conversation_id, _), message_id in sender_last.items()
+            if conversation_id in conversation_ids
+        ]
+        
+        with pool.connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.executemany(MESSAGE_INSERT_SQL, rows)
+            
+            cursor.executemany(SUMMARY_UPSERT_SQL, summaries)
+            
+            # كل مرسل قرأ المحادثة حتى آخر رسالة أرسلها
+            cursor.executemany(READ_WATERMARK_SQL, watermarks)
     
-    def get_conversation_messages(self, conversation_id, limit=50):
-        """الحصول على رسائل المحادثة"""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_conversation_summary(self, conversation_id):
+        """الحصول على ملخص المحادثة (آخر رسالة) من جزئها"""
+        with self._message_pool(conversation_id).connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT last_message_id, last_message_at, last_sender_id, snippet, seq
+                FROM conversation_summaries WHERE conversation_id = ?
+            """, (conversation_id,))
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'last_message_id': row[0], 'last_message_at': row[1],
+                    'last_sender_id': row[2], 'snippet': row[3], 'seq': row[4]
+                }
+            return None
+    
+    def get_conversation_version(self, conversation_id):
+        """إصدار المحادثة: رقم تسلسل آخر رسالة (0 إذا لم تكن هناك رسائل)
+        
+        يُقرأ من ملخص المحادثة في كل استدعاء (بحث بالمفتاح الأساسي) حتى تظهر
+        الرسائل التي كتبتها عمليات أخرى.
+        """
+        with self._message_pool(conversation_id).connection() as conn:
+            row = conn.execute("""
+                SELECT seq FROM conversation_summaries WHERE conversation_id = ?
+            """, (conversation_id,)).fetchone()
+            return row[0] if row else 0
+    
+    def mark_conversation_as_read(self, conversation_id, user_id):
+        """تقديم علامة القراءة إلى آخر رسالة (عداد غير المقروء يصبح صفراً)
+        
+        العلامة رقم تسلسل تُنسخ من ملخص المحادثة في نفس الجملة، وعداد غير
+        المقروء يُحسب عند القراءة (رقم آخر رسالة ناقص العلامة)، لذلك لا تضيع
+        رسالة متزامنة.
+        """
+        with self._message_pool(conversation_id).connection(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(MARK_READ_SQL, (user_id, conversation_id))
+            return cursor.rowcount > 0
+    
+    def get_unread_count(self, user_id):
+        """مجموع الرسائل غير المقروءة للمستخدم من أرقام التسلسل وعلامات القراءة"""
+        if self.shards is None:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT COALESCE(SUM(MAX(s.seq - COALESCE(r.last_read_seq, 0), 0)), 0)
+                    FROM conversation_participants cp
+                    INNER JOIN conversation_summaries s ON s.conversation_id = cp.conversation_id
+                    LEFT JOIN conversation_reads r
+                           ON r.conversation_id = cp.conversation_id AND r.user_id = cp.user_id
+                    WHERE cp.user_id = ?
+                """, (user_id,))
+                return cursor.fetchone()[0]
+        
+        with self.pool.connection() as conn:
+            conversation_ids = [row[0] for row in conn.execute("""
+                SELECT conversation_id FROM conversation_participants WHERE user_id = ?
+            """, (user_id,))]
+        
+        total = 0
+        for pool, ids in self.shards.group_by_shard(conversation_ids).items():
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT COALESCE(SUM(MAX(s.seq - COALESCE(r.last_read_seq, 0), 0)), 0)
+                    FROM conversation_summaries s
+                    LEFT JOIN conversation_reads r
+                           ON r.conversation_id = s.conversation_id AND r.user_id = ?
+                    WHERE s.conversation_id IN ({", ".join("?" for _ in ids)})
+                """, [user_id] + ids)
+                total += cursor.fetchone()[0]
+        return total
+    
+    def _get_user_names(self, user_ids):
+        """الحصول على أسماء عدة مستخدمين دفعة واحدة: id -> (username, display_name)"""
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return {}
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, username, display_name FROM users
+                WHERE id IN ({", ".join("?" for _ in user_ids)})
+            """, user_ids)
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    
+    def _build_messages(self, rows):
+        """تحويل صفوف (id, conversation_id, sender_id, content, message_type,
+        created_at, rowid, seq) إلى عرض كسول من كائنات Message"""
+        # أسماء المرسلين من القاعدة الرئيسية (قد تكون الرسائل في جزء آخر)
+        names = self._get_user_names(row[2] for row in rows)
+        
+        def to_message(row):
+            sender_username, sender_name = names.get(row[2], (None, None))
+            return Message(row[0], row[1], row[2], row[3], row[4], row[5],
+                           sender_username, sender_name, encode_message_cursor(row[5], row[6]),
+                           row[7])
+        
+        # الصفوف الخام تبقى كما هي وتتحول إلى كائنات عند الوصول إليها فقط
+        return LazyRows(rows, to_message)
+    
+    def get_messages_since(self, conversation_id, seq, limit=500):
+        """الحصول على الرسائل التي رقم تسلسلها أكبر من ``seq`` مرتبة تصاعدياً
+        
+        استعلام واحد على الفهرس (conversation_id, seq)، لذلك يكون رخيصاً عندما
+        لا توجد رسائل جديدة ويرى رسائل العمليات الأخرى. ``version`` في النتيجة
+        هو رقم تسلسل آخر رسالة معادة، و``has_more`` يعني أن هناك أكثر من
+        ``limit`` رسالة جديدة.
+        """
+        with self._message_pool(conversation_id).connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT m.id, m.conversation_id, m.sender_id, m.content, m.message_type,
-                       m.created_at, u.username, u.display_name
+                       m.created_at, m.rowid, m.seq
                 FROM messages m
-                INNER JOIN users u ON u.id = m.sender_id
-                WHERE m.conversation_id = ?
-                ORDER BY m.created_at ASC
+                WHERE m.conversation_id = ? AND m.seq > ?
+                ORDER BY m.seq
                 LIMIT ?
-            """, (conversation_id, limit))
-            
-            messages = []
-            for row in cursor.fetchall():
-                messages.append({
-                    'id': row[0],
-                    'conversation_id': row[1],
-                    'sender_id': row[2],
-                    'content': row[3],
-                    'message_type': row[4],
-                    'created_at': row[5],
-                    'sender_username': row[6],
-                    'sender_name': row[7]
-                })
-            return messages
+            """, (conversation_id, seq, limit + 1))
+            rows = cursor.fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'messages': self._build_messages(rows),
+            'version': rows[-1][7] if rows else seq,
+            'has_more': has_more
+        }
+    
+    def get_conversation_messages(self, conversation_id, limit=50, before=None, after=None):
+        """الحصول على صفحة من رسائل المحادثة مرتبة من الأقدم للأحدث"""
+        return self.get_conversation_messages_page(conversation_id, limit, before, after)['messages']
+    
+    def get_conversation_messages_page(self, conversation_id, limit=50, before=None, after=None):
+        """الحصول على صفحة من رسائل المحادثة باستخدام مؤشر (keyset)
+        
+        بدون مؤشر تُعاد أحدث الرسائل. مع ``before`` تُعاد الرسائل الأقدم من
+        المؤشر ومع ``after`` الرسائل الأحدث منه. الرسائل داخل الصفحة مرتبة
+        دائماً من الأقدم للأحدث.
+        """
+        if before is not None and after is not None:
+            raise ValueError("Use either before or after, not both")
+        
+        if after is not None:
+            created_at, row_id = decode_message_cursor(after)
+            condition = "AND (m.created_at, m.rowid) > (?, ?)"
+            order = "ASC"
+            params = (conversation_id, created_at, row_id, limit + 1)
+        elif before is not None:
+            created_at, row_id = decode_message_cursor(before)
+            condition = "AND (m.created_at, m.rowid) < (?, ?)"
+            order = "DESC"
+            params = (conversation_id, created_at, row_id, limit + 1)
+        else:
+            condition = ""
+            order = "DESC"
+            params = (conversation_id, limit + 1)
+        
+        with self._message_pool(conversation_id).connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT m.id, m.conversation_id, m.sender_id, m.content, m.message_type,
+                       m.created_at, m.rowid, m.seq
+                FROM messages m
+                WHERE m.conversation_id = ? {condition}
+                ORDER BY m.created_at {order}, m.rowid {order}
+                LIMIT ?
+            """, params)
+            rows = cursor.fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "DESC":
+            rows.reverse()
+        
+        messages = self._build_messages(rows)
+        
+        return {
+            'messages': messages,
+            'older_cursor': messages[0]['cursor'] if messages else before,
+            'newer_cursor': messages[-1]['cursor'] if messages else after,
+            'has_older': has_more if after is None else True,
+            'has_newer': has_more if after is not None else before is not None
+        }
+    
+    def close(self):
+        """إغلاق جميع الاتصالات"""
+        self.pool.close()
+        if self.shards is not None:
+            self.shards.close()
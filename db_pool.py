@@ -0,0 +1,167 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """مجمع اتصالات SQLite دائمة ومحدودة العدد
+
+    تُفتح الاتصالات مرة واحدة بإعدادات WAL ثم يُعاد استخدامها بين الطلبات
+    بدلاً من فتح اتصال جديد وإغلاقه في كل استعلام. الاستعارة المتداخلة داخل
+    نفس الخيط تعيد نفس الاتصال حتى لا يحجز الخيط أكثر من اتصال واحد.
+    """
+
+    def __init__(self, db_path, max_size=8, timeout=30.0, cache_size_kb=8192,
+                 mmap_size=64 * 1024 * 1024, statement_cache_size=256, on_connect=None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.statement_cache_size = statement_cache_size
+        self.on_connect = on_connect
+
+        self._idle = deque()
+        self._created = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+
+        # الإحصائيات
+        self._checkouts = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _open(self):
+        """فتح اتصال جديد وضبط إعداداته"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+            isolation_level=None,
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = OFF")
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def _acquire(self):
+        """أخذ اتصال خامل أو إنشاء اتصال جديد أو الانتظار"""
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.max_size:
+                    self._created += 1
+                    conn = None
+                    break
+                waited = True
+                if not self._cond.wait(self.timeout):
+                    raise sqlite3.OperationalError("Timed out waiting for a pooled connection")
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self._checkouts += 1
+            self._total_wait += elapsed
+            self._max_wait = max(self._max_wait, elapsed)
+            if waited:
+                self._waits += 1
+        return conn
+
+    def _release(self, conn):
+        """إرجاع الاتصال إلى المجمع"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            if self._closed:
+                conn.close()
+                self._created -= 1
+                return
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, write=False):
+        """استعارة اتصال من المجمع
+
+        عمليات الكتابة تعمل داخل معاملة BEGIN IMMEDIATE يتم الالتزام بها عند
+        الخروج الطبيعي والتراجع عنها عند حدوث استثناء، أما القراءة فتعمل بدون
+        معاملة صريحة. الاستدعاءات المتداخلة في نفس الخيط تشارك الاتصال
+        والمعاملة الخارجية.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            if write and not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+
+    def get_stats(self):
+        """الحصول على إحصائيات المجمع"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'max_size': self.max_size,
+                'open_connections': self._created,
+                'idle_connections': len(self._idle),
+                'in_use': self._created - len(self._idle),
+                'checkouts': checkouts,
+                'waits': self._waits,
+                'avg_checkout_ms': (self._total_wait / checkouts * 1000) if checkouts else 0.0,
+                'max_checkout_ms': self._max_wait * 1000,
+            }
+
+    def close(self):
+        """إغلاق جميع الاتصالات الخاملة"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+            self._cond.notify_all()
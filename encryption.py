@@ -1,39 +1,150 @@
-def vigenere_encrypt(text: str, key: str) -> str:
-    encrypted = []
-    key = key.lower()
-    key_index = 0
-    for char in text:
-        if char.isalpha():
-            shift = ord(key[key_index % len(key)]) - ord('a')
-            if char.islower():
-                encrypted.append(chr((ord(char) - ord('a') + shift) % 26 + ord('a')))
-            else:
-                encrypted.append(chr((ord(char) - ord('A') + shift) % 26 + ord('A')))
-            key_index += 1
-        else:
-            encrypted.append(char)
-    return "".join(encrypted)
-
-def vigenere_decrypt(text: str, key: str) -> str:
-    decrypted = []
-    key = key.lower()
-    key_index = 0
-    for char in text:
-        if char.isalpha():
-            shift = ord(key[key_index % len(key)]) - ord('a')
-            if char.islower():
-                decrypted.append(chr((ord(char) - ord('a') - shift) % 26 + ord('a')))
-            else:
-                decrypted.append(chr((ord(char) - ord('A') - shift) % 26 + ord('A')))
-            key_index += 1
-        else:
-            decrypted.append(char)
-    return "".join(decrypted)
-
-SECRET_KEY = "securechat"  # مفتاح التشفير (غيره إذا حبيت)
-
-def encrypt_message(msg: str) -> str:
-    return vigenere_encrypt(msg, SECRET_KEY)
-
-def decrypt_message(msg: str) -> str:
-    return vigenere_decrypt(msg, SECRET_KEY)
+import re
+from functools import lru_cache
+from itertools import accumulate
+
+# سلاسل الأحرف: ASCII بالضبط، وفي غيرها مرشحون يُتحقق منهم بـ isalpha
+_ASCII_LETTER_RUNS = re.compile(r'([A-Za-z]+)')
+_LETTER_RUNS = re.compile(r'([^\W\d_]+)')
+# النصوص الأقصر من هذا أسرع بالمرور على الأحرف مباشرة
+_SHORT_TEXT = 200
+
+
+class _ShiftTable(dict):
+    """جدول ``str.translate`` لإزاحة واحدة، يُملأ عند أول ظهور لكل حرف
+
+    الحرف الصغير يُزاح حول a وأي حرف آخر (كبير أو بلا حالة مثل العربية) حول A.
+    """
+
+    def __init__(self, shift):
+        super().__init__()
+        self.shift = shift
+
+    def __missing__(self, code):
+        base = ord('a') if chr(code).islower() else ord('A')
+        mapped = self[code] = chr((code - base + self.shift) % 26 + base)
+        return mapped
+
+
+_SHIFT_TABLES = tuple(_ShiftTable(shift) for shift in range(26))
+
+
+class VigenereStream:
+    """مشفر تدريجي يحفظ موضع المفتاح بين الاستدعاءات (لتشفير نص على أجزاء)"""
+
+    def __init__(self, codec, tables):
+        self.codec = codec
+        self.tables = tables
+        self.key_index = 0
+
+    def __call__(self, text: str) -> str:
+        result, self.key_index = self.codec._transform(text, self.tables, self.key_index)
+        return result
+
+
+class VigenereCodec:
+    """تشفير فيجنير بمفتاح ثابت مع جداول إزاحة محسوبة مرة واحدة
+
+    الأحرف الأبجدية تُجمع في نص واحد، وكل حرف رقم k فيه يستخدم إزاحة المفتاح
+    k % len(key)، لذلك يُترجم كل شريحة ``letters[p::len(key)]`` بجدول واحد ثم
+    تُدمج الشرائح وتُعاد الأحرف إلى مواضعها.
+
+    المفتاح الفارغ يعمل كالتنفيذ الأصلي: النص الخالي من الأحرف الأبجدية يعود
+    كما هو، وأي حرف أبجدي يرمي ZeroDivisionError.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        shifts = [ord(char) - ord('a') for char in key.lower()]
+        self._encrypt_tables = tuple(_SHIFT_TABLES[shift % 26] for shift in shifts)
+        self._decrypt_tables = tuple(_SHIFT_TABLES[-shift % 26] for shift in shifts)
+
+    def encrypt(self, text: str) -> str:
+        return self._transform(text, self._encrypt_tables, 0)[0]
+
+    def decrypt(self, text: str) -> str:
+        return self._transform(text, self._decrypt_tables, 0)[0]
+
+    def transform(self, text: str, direction: int, key_index: int = 0):
+        """تطبيق التشفير (direction=1) أو فكه (-1) بدءاً من موضع المفتاح ``key_index``
+
+        يعيد (النتيجة، موضع المفتاح التالي).
+        """
+        tables = self._encrypt_tables if direction > 0 else self._decrypt_tables
+        return self._transform(text, tables, key_index)
+
+    def encoder(self) -> VigenereStream:
+        """مشفر تدريجي: ربط نتائجه على أجزاء نص يساوي ``encrypt`` على النص كاملاً"""
+        return VigenereStream(self, self._encrypt_tables)
+
+    def decoder(self) -> VigenereStream:
+        """فاك تشفير تدريجي"""
+        return VigenereStream(self, self._decrypt_tables)
+
+    def _transform(self, text, tables, key_index):
+        if not tables:
+            if any(char.isalpha() for char in text):
+                raise ZeroDivisionError("Vigenere key is empty")
+            return text, key_index
+        if len(text) < _SHORT_TEXT:
+            return self._transform_chars(text, tables, key_index)
+        parts = (_ASCII_LETTER_RUNS if text.isascii() else _LETTER_RUNS).split(text)
+        runs = parts[1::2]
+        if not runs:
+            return text, key_index
+        letters = ''.join(runs)
+        if not letters.isalpha():
+            # المرشح يشمل أحرفاً رقمية غير عشرية (مثل ²) ليست أبجدية
+            return self._transform_chars(text, tables, key_index)
+
+        period = len(tables)
+        slices = [
+            letters[offset::period].translate(tables[(key_index + offset) % period])
+            for offset in range(period)
+        ]
+        shifted = ''.join(map(''.join, zip(*slices)))
+        remainder = len(letters) % period
+        if remainder:
+            shifted += ''.join(piece[-1] for piece in slices[:remainder])
+
+        ends = list(accumulate(map(len, runs)))
+        parts[1::2] = [shifted[start:end] for start, end in zip([0] + ends, ends)]
+        return ''.join(parts), (key_index + len(letters)) % period
+
+    def _transform_chars(self, text, tables, key_index):
+        period = len(tables)
+        result = []
+        for char in text:
+            if char.isalpha():
+                result.append(tables[key_index % period][ord(char)])
+                key_index += 1
+            else:
+                result.append(char)
+        return ''.join(result), key_index % period
+
+
+@lru_cache(maxsize=32)
+def get_codec(key: str) -> VigenereCodec:
+    """مشفر فيجنير مخزن لكل مفتاح"""
+    return VigenereCodec(key)
+
+def vigenere_transform(text: str, key: str, direction: int, key_index: int = 0):
+    """تطبيق فيجنير على جزء من نص بدءاً من موضع المفتاح ``key_index``
+
+    ``direction`` يساوي 1 للتشفير و -1 لفك التشفير. يعيد (النتيجة، موضع المفتاح
+    التالي) حتى يمكن متابعة التشفير على الجزء التالي من نفس النص.
+    """
+    return get_codec(key).transform(text, direction, key_index)
+
+def vigenere_encrypt(text: str, key: str) -> str:
+    return get_codec(key).encrypt(text)
+
+def vigenere_decrypt(text: str, key: str) -> str:
+    return get_codec(key).decrypt(text)
+
+SECRET_KEY = "securechat"  # مفتاح التشفير (غيره إذا حبيت)
+
+def encrypt_message(msg: str) -> str:
+    return vigenere_encrypt(msg, SECRET_KEY)
+
+def decrypt_message(msg: str) -> str:
+    return vigenere_decrypt(msg, SECRET_KEY)
@@ -1,69 +1,177 @@
+import re
 import secrets
 import string
+import sys
+from array import array
+from itertools import accumulate
+
+# جداول الأحرف تتكرر كل 130 إزاحة (المضاعف المشترك الأصغر لـ 26 حرفاً و 10 أرقام)
+_SHIFT_PERIOD = 130
+
+
+class _ShiftTable(dict):
+    """جدول ``str.translate`` لإزاحة واحدة
+
+    أحرف ASCII والأرقام محسوبة مسبقاً. بقية الأحرف (مثل العربية) تُحسب عند أول
+    ظهور بنفس القاعدة القديمة تماماً: أي حرف أبجدي يُزاح حول a (أو A إذا كان
+    كبيراً) وأي رقم يُزاح بقيمته، ثم تُحفظ النتيجة في الجدول.
+    """
+
+    def __init__(self, shift):
+        super().__init__()
+        self.shift = shift
+        for char in string.ascii_letters + string.digits:
+            self[ord(char)] = self._map(char)
+
+    def _map(self, char):
+        if char.isalpha():
+            ascii_offset = 65 if char.isupper() else 97
+            return chr((ord(char) - ascii_offset + self.shift) % 26 + ascii_offset)
+        if char.isdigit():
+            return str((int(char) + self.shift) % 10)
+        return char
+
+    def __missing__(self, code):
+        mapped = self[code] = self._map(chr(code))
+        return mapped
+
+
+# كل الجداول تُبنى مرة واحدة ولا تتغير إلا بإضافة أحرف جديدة بنفس القيم
+_SHIFT_TABLES = tuple(_ShiftTable(shift) for shift in range(_SHIFT_PERIOD))
+
+
+class _ComposedTable(dict):
+    """جدول ``str.translate`` لدالة (حرف -> نص)، يُملأ عند أول ظهور لكل حرف"""
+
+    def __init__(self, transform):
+        super().__init__()
+        self.transform = transform
+        for char in string.ascii_letters + string.digits:
+            self[ord(char)] = transform(char)
+
+    def __missing__(self, code):
+        mapped = self[code] = self.transform(chr(code))
+        return mapped
+
+
+def _swap_char(char):
+    """تبديل حالة حرف أبجدي (المرحلة الثالثة من التشفير المتطور)"""
+    if char.isalpha():
+        return char.upper() if char.islower() else char.lower()
+    return char
+
+
+# عناصر array بحجم 4 بايت لنسخ النص بترميز UTF-32 بترتيب بايتات الجهاز
+_UTF32_TYPECODE = next(code for code in 'IL' if array(code).itemsize == 4)
+_UTF32_CODEC = 'utf-32-le' if sys.byteorder == 'little' else 'utf-32-be'
+
+
+def _ascii_table(table):
+    """جدول ``bytes.translate`` لأحرف ASCII (كلها تُشفر إلى أحرف ASCII)"""
+    return bytes(ord(table[code]) for code in range(128)) + bytes(range(128, 256))
+
+
+_ASCII_TABLES = tuple(map(_ascii_table, _SHIFT_TABLES))
+
+# أحرف غير ASCII يغيرها جدول الإزاحة (\w يشمل كل ما يحقق isalpha أو isdigit)
+_NON_ASCII_ALNUM = re.compile(r'[^\W\x00-\x7f]')
+
+
+def _translate_joined(texts, shift):
+    """تطبيق جدول إزاحة على دفعة نصوص بترجمة واحدة ثم تقسيم النتيجة
+
+    كل حرف يقابله حرف واحد بالضبط، لذلك تبقى أطوال النصوص كما هي. إذا لم
+    تحتو الدفعة حروفاً أو أرقاماً غير ASCII (مثل النصوص المشفرة، لأن التشفير
+    يحولها كلها إلى ASCII) تُترجم بايتات UTF-8 بـ ``bytes.translate``: بايتات
+    الأحرف متعددة البايتات كلها >= 128 ولا يغيرها الجدول. غير ذلك يمر كل حرف
+    على جدول القاموس، والدمج لا يسرّع ذلك فيُترجم كل نص وحده.
+    """
+    joined = ''.join(texts)
+    if joined.isascii():
+        joined = joined.encode('ascii').translate(_ASCII_TABLES[shift]).decode('ascii')
+    elif _NON_ASCII_ALNUM.search(joined) is None:
+        data = joined.encode('utf-8', 'surrogatepass').translate(_ASCII_TABLES[shift])
+        joined = data.decode('utf-8', 'surrogatepass')
+    else:
+        return [text.translate(_SHIFT_TABLES[shift]) for text in texts]
+    ends = list(accumulate(map(len, texts)))
+    return [joined[start:end] for start, end in zip([0] + ends, ends)]
+
+
+def _translate_many(texts, shift):
+    """تشفير أو فك دفعة نصوص بإزاحة ``shift`` (بين 0 و _SHIFT_PERIOD - 1)
+
+    نصوص ASCII تُجمع في ترجمة واحدة والبقية في ترجمة أخرى، حتى لا يُبطئ نص
+    عربي واحد ترجمة كل نصوص ASCII في الدفعة.
+    """
+    texts = list(texts)
+    if len(texts) < 2:
+        return [text.translate(_SHIFT_TABLES[shift]) for text in texts]
+    is_ascii = [text.isascii() for text in texts]
+    if all(is_ascii):
+        return _translate_joined(texts, shift)
+    ascii_results = iter(_translate_joined(
+        [text for text, flag in zip(texts, is_ascii) if flag], shift))
+    other_results = iter(_translate_joined(
+        [text for text, flag in zip(texts, is_ascii) if not flag], shift))
+    return [next(ascii_results) if flag else next(other_results) for flag in is_ascii]
+
+
+def _replace_even(text, even):
+    """نسخة من ``text`` بعد وضع أحرف ``even`` في المواقع الزوجية (بنفس العدد)"""
+    buffer = array(_UTF32_TYPECODE, text.encode(_UTF32_CODEC, 'surrogatepass'))
+    buffer[0::2] = array(_UTF32_TYPECODE, even.encode(_UTF32_CODEC, 'surrogatepass'))
+    return buffer.tobytes().decode(_UTF32_CODEC, 'surrogatepass')
+
 
 class CaesarCipher:
-    """تشفير قيصر المبسط للرسائل مع التشفير التلقائي"""
+    """تشفير قيصر المبسط للرسائل مع التشفير التلقائي
+
+    الكائن غير قابل للتعديل: الإزاحة تُحدد عند الإنشاء و ``with_shift`` يعيد
+    مشفراً جديداً، لذلك يمكن مشاركة نفس الكائن بين كل الجلسات بأمان.
+    """
     
     def __init__(self, default_shift=7):
         """تهيئة المشفر مع إزاحة افتراضية"""
-        self.default_shift = default_shift
+        self._default_shift = default_shift
+    
+    @property
+    def default_shift(self):
+        return self._default_shift
     
     def encrypt(self, text, shift=None):
         """تشفير النص باستخدام تشفير قيصر التلقائي"""
         if shift is None:
-            shift = self.default_shift
-            
-        result = ""
-        for char in text:
-            if char.isalpha():
-                # تحديد الأساس (A أو a)
-                ascii_offset = 65 if char.isupper() else 97
-                # تطبيق الإزاحة مع التدوير
-                shifted = (ord(char) - ascii_offset + shift) % 26
-                result += chr(shifted + ascii_offset)
-            elif char.isdigit():
-                # تشفير الأرقام
-                shifted = (int(char) + shift) % 10
-                result += str(shifted)
-            else:
-                # الاحتفاظ بالرموز كما هي
-                result += char
-        
-        return result
+            shift = self._default_shift
+        return text.translate(_SHIFT_TABLES[shift % _SHIFT_PERIOD])
     
     def decrypt(self, encrypted_text, shift=None):
         """فك تشفير النص تلقائياً"""
         if shift is None:
-            shift = self.default_shift
-            
-        result = ""
-        for char in encrypted_text:
-            if char.isalpha():
-                # تحديد الأساس (A أو a)
-                ascii_offset = 65 if char.isupper() else 97
-                # عكس الإزاحة مع التدوير
-                shifted = (ord(char) - ascii_offset - shift) % 26
-                result += chr(shifted + ascii_offset)
-            elif char.isdigit():
-                # فك تشفير الأرقام
-                shifted = (int(char) - shift) % 10
-                result += str(shifted)
-            else:
-                # الاحتفاظ بالرموز كما هي
-                result += char
-        
-        return result
+            shift = self._default_shift
+        return encrypted_text.translate(_SHIFT_TABLES[-shift % _SHIFT_PERIOD])
+    
+    def encrypt_many(self, texts, shift=None):
+        """تشفير دفعة نصوص، النتيجة بنفس الترتيب"""
+        if shift is None:
+            shift = self._default_shift
+        return _translate_many(texts, shift % _SHIFT_PERIOD)
+    
+    def decrypt_many(self, encrypted_texts, shift=None):
+        """فك تشفير دفعة نصوص، النتيجة بنفس الترتيب"""
+        if shift is None:
+            shift = self._default_shift
+        return _translate_many(encrypted_texts, -shift % _SHIFT_PERIOD)
     
     def generate_random_shift(self):
         """توليد إزاحة عشوائية"""
         return secrets.randbelow(25) + 1
     
-    def set_shift(self, shift):
-        """تحديد إزاحة جديدة"""
-        if 1 <= shift <= 25:
-            self.default_shift = shift
-            return True
-        return False
+    def with_shift(self, shift):
+        """مشفر جديد بإزاحة أخرى (الإزاحة بين 1 و 25)"""
+        if not 1 <= shift <= 25:
+            raise ValueError(f"Shift must be between 1 and 25, got {shift}")
+        return type(self)(shift)
     
     def get_shift(self):
         """الحصول على الإزاحة الحالية"""
@@ -97,51 +205,70 @@ class CaesarCipher:
 class AdvancedCaesarCipher(CaesarCipher):
     """تشفير قيصر متطور مع تحسينات إضافية"""
     
-    def __init__(self):
-        super().__init__(default_shift=13)  # ROT13 كافتراضي
+    def __init__(self, default_shift=13):
+        super().__init__(default_shift=default_shift)  # ROT13 كافتراضي
         self.custom_alphabet = string.ascii_letters + string.digits + "!@#$%^&*()_+-=[]{}|;:,.<>?"
+        
+        # جداول المواقع الفردية: قيصر فقط، والزوجية: قيصر مع تبديل الحالة
+        encrypt_table = _SHIFT_TABLES[default_shift % _SHIFT_PERIOD]
+        decrypt_table = _SHIFT_TABLES[-default_shift % _SHIFT_PERIOD]
+        self._encrypt_odd = encrypt_table
+        self._decrypt_odd = decrypt_table
+        self._encrypt_even = _ComposedTable(lambda char: _swap_char(char.translate(encrypt_table)))
+        # الناتج يُعكس مع النص كله، لذلك يُعكس هنا أيضاً إذا كان أكثر من حرف
+        self._decrypt_even = _ComposedTable(lambda char: _swap_char(char).translate(decrypt_table)[::-1])
+        self._ascii_tables = tuple(map(_ascii_table, (
+            self._encrypt_odd, self._encrypt_even, self._decrypt_odd, self._decrypt_even
+        )))
     
     def advanced_encrypt(self, text):
-        """تشفير متطور مع خلط الأحرف"""
-        # المرحلة الأولى: تشفير قيصر عادي
-        stage1 = self.encrypt(text)
+        """تشفير متطور مع خلط الأحرف
         
-        # المرحلة الثانية: عكس النص
-        stage2 = stage1[::-1]
+        المراحل الثلاث (قيصر، عكس النص، تبديل حالة المواقع الزوجية) في خطوة
+        واحدة: عكس النص مرة ثم جدول ترجمة لكل زوجية موقع.
+        """
+        if text.isascii():
+            odd_table, even_table = self._ascii_tables[:2]
+            data = text.encode('ascii')[::-1]
+            buffer = bytearray(data.translate(odd_table))
+            buffer[0::2] = data[0::2].translate(even_table)
+            return buffer.decode('ascii')
         
-        # المرحلة الثالثة: تبديل الأحرف بطريقة معينة
-        result = ""
-        for i, char in enumerate(stage2):
-            if char.isalpha():
-                if i % 2 == 0:
-                    result += char.upper() if char.islower() else char.lower()
-                else:
-                    result += char
-            else:
-                result += char
-        
-        return result
+        reversed_text = text[::-1]
+        return _replace_even(reversed_text.translate(self._encrypt_odd),
+                             reversed_text[0::2].translate(self._encrypt_even))
     
     def advanced_decrypt(self, encrypted_text):
         """فك التشفير المتطور"""
-        # عكس المرحلة الثالثة: إرجاع تبديل الأحرف
-        stage1 = ""
-        for i, char in enumerate(encrypted_text):
-            if char.isalpha():
-                if i % 2 == 0:
-                    stage1 += char.upper() if char.islower() else char.lower()
-                else:
-                    stage1 += char
-            else:
-                stage1 += char
-        
-        # عكس المرحلة الثانية: عكس النص
-        stage2 = stage1[::-1]
+        if encrypted_text.isascii():
+            odd_table, even_table = self._ascii_tables[2:]
+            data = encrypted_text.encode('ascii')
+            buffer = bytearray(data.translate(odd_table))
+            buffer[0::2] = data[0::2].translate(even_table)
+            return buffer[::-1].decode('ascii')
         
-        # عكس المرحلة الأولى: فك تشفير قيصر
-        result = self.decrypt(stage2)
-        
-        return result
+        even = encrypted_text[0::2].translate(self._decrypt_even)
+        if len(even) != (len(encrypted_text) + 1) // 2:
+            # تبديل حالة بعض الأحرف ينتج أكثر من حرف (مثل ß): المراحل بالترتيب
+            return self.decrypt(self._swap_case(encrypted_text)[::-1])
+        return _replace_even(encrypted_text.translate(self._decrypt_odd), even)[::-1]
+    
+    def advanced_encrypt_many(self, texts):
+        """التشفير المتطور لدفعة نصوص"""
+        return [self.advanced_encrypt(text) for text in texts]
+    
+    def advanced_decrypt_many(self, encrypted_texts):
+        """فك التشفير المتطور لدفعة نصوص"""
+        return [self.advanced_decrypt(text) for text in encrypted_texts]
+    
+    @staticmethod
+    def _swap_case(text, start=0):
+        """تبديل حالة الأحرف في المواقع الزوجية (المرحلة الثالثة، وهي تعكس نفسها)
+
+        ``start`` موضع أول حرف في النص الكامل عند المعالجة على أجزاء.
+        """
+        return ''.join(_swap_char(char) if i % 2 == 0 else char
+                       for i, char in enumerate(text, start))
 
 
 class MessageEncryptor:
@@ -166,6 +293,18 @@ class MessageEncryptor:
         else:
             return self.caesar.decrypt(encrypted_message)
     
+    def encrypt_many(self, messages):
+        """تشفير دفعة رسائل حسب الطريقة المحددة"""
+        if self.encryption_method == "advanced":
+            return self.advanced.advanced_encrypt_many(messages)
+        return self.caesar.encrypt_many(messages)
+    
+    def decrypt_many(self, encrypted_messages):
+        """فك تشفير دفعة رسائل حسب الطريقة المحددة"""
+        if self.encryption_method == "advanced":
+            return self.advanced.advanced_decrypt_many(encrypted_messages)
+        return self.caesar.decrypt_many(encrypted_messages)
+    
     def set_encryption_method(self, method):
         """تحديد طريقة التشفير"""
         if method in ["simple", "advanced"]:
@@ -0,0 +1,20 @@
+"""قراءة إعدادات رقمية موجبة من متغيرات البيئة"""
+import os
+
+
+def get_env_int(name, default):
+    """عدد صحيح موجب من متغير البيئة ``name``، أو ``default`` إذا كان غير صالح"""
+    try:
+        value = int(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except ValueError:
+        return default
+
+
+def get_env_float(name, default):
+    """عدد موجب من متغير البيئة ``name``، أو ``default`` إذا كان غير صالح"""
+    try:
+        value = float(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except ValueError:
+        return default
@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+def conversation_topic(conversation_id):
+    """موضوع أحداث محادثة"""
+    return f"conversation:{conversation_id}"
+
+
+def user_topic(user_id):
+    """موضوع أحداث مستخدم (كل محادثاته)"""
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """اشتراك في مواضيع الناقل مع طابور أحداث محدود
+
+    لا يوجد خيط لكل مشترك: الأحداث تُضاف إلى الطابور عند النشر، والمشترك
+    ينتظر بـ ``get``/``poll`` (شرط threading) أو ``aget``/``async for``
+    (futures في حلقة asyncio الخاصة به).
+    """
+
+    def __init__(self, bus, topics, max_queue):
+        self.bus = bus
+        self.topics = frozenset(topics)
+        self.closed = False
+        self.dropped = 0
+        self.last_active = time.monotonic()
+        self._queue = deque()
+        self._max_queue = max_queue
+        self._cond = threading.Condition()
+        self._waiters = []  # (loop, future) للمنتظرين من asyncio
+
+    def _deliver(self, event):
+        """إضافة حدث إلى الطابور (يستدعيها الناقل)"""
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._queue) >= self._max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(event)
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        return True
+
+    def _close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def drain(self):
+        """إعادة كل الأحداث المنتظرة بدون انتظار"""
+        with self._cond:
+            self.last_active = time.monotonic()
+            events = list(self._queue)
+            self._queue.clear()
+            return events
+
+    def get(self, timeout=None):
+        """انتظار حدث واحد (long-poll)، يعيد None عند انتهاء المهلة أو الإغلاق"""
+        with self._cond:
+            self.last_active = time.monotonic()
+            self._cond.wait_for(lambda: self._queue or self.closed, timeout)
+            self.last_active = time.monotonic()
+            return self._queue.popleft() if self._queue else None
+
+    def poll(self, timeout=None):
+        """انتظار وصول حدث ثم إعادة كل الأحداث المتراكمة (قائمة فارغة عند انتهاء المهلة)"""
+        with self._cond:
+            self.last_active = time.monotonic()
+            self._cond.wait_for(lambda: self._queue or self.closed, timeout)
+            self.last_active = time.monotonic()
+            events = list(self._queue)
+            self._queue.clear()
+            return events
+
+    async def aget(self, timeout=None):
+        """نسخة asyncio من ``get``"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._cond:
+                self.last_active = time.monotonic()
+                if self._queue:
+                    return self._queue.popleft()
+                if self.closed:
+                    return None
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                self._discard_waiter(future)
+                return None
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                self._discard_waiter(future)
+                return None
+
+    def _discard_waiter(self, future):
+        with self._cond:
+            self._waiters = [waiter for waiter in self._waiters if waiter[1] is not future]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.aget()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def close(self):
+        """إلغاء الاشتراك"""
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class EventBus:
+    """ناقل أحداث نشر/اشتراك داخل العملية
+
+    الاشتراكات التي لم تُستخدم خلال ``idle_timeout`` ثانية (مثلاً جلسة أُغلقت
+    دون إلغاء الاشتراك) تُحذف تلقائياً عند الاشتراكات الجديدة.
+    """
+
+    def __init__(self, max_queue=1000, idle_timeout=600.0):
+        self.max_queue = max_queue
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._topics = {}  # topic -> set(Subscription)
+        self._subscriptions = set()
+        self._last_sweep = time.monotonic()
+        self.published = 0
+        self.delivered = 0
+        self.expired = 0
+
+    def subscribe(self, topics):
+        """الاشتراك في مجموعة مواضيع"""
+        subscription = Subscription(self, topics, self.max_queue)
+        self._expire_idle()
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """إلغاء اشتراك"""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+        subscription._close()
+
+    def _expire_idle(self):
+        """حذف الاشتراكات الخاملة (فحص واحد كل عُشر مهلة الخمول على الأكثر)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep < self.idle_timeout / 10:
+                return
+            self._last_sweep = now
+            idle = [sub for sub in self._subscriptions
+                    if now - sub.last_active > self.idle_timeout]
+        for subscription in idle:
+            self.unsubscribe(subscription)
+        if idle:
+            with self._lock:
+                self.expired += len(idle)
+
+    def publish(self, topics, event):
+        """نشر حدث على موضوع أو عدة مواضيع، يعيد عدد المشتركين الذين استلموه
+
+        المشترك في أكثر من موضوع من المواضيع يستلم الحدث مرة واحدة.
+        """
+        if isinstance(topics, str):
+            topics = (topics,)
+        with self._lock:
+            subscribers = set()
+            for topic in topics:
+                subscribers.update(self._topics.get(topic, ()))
+            self.published += 1
+
+        delivered = sum(1 for subscription in subscribers if subscription._deliver(event))
+        with self._lock:
+            self.delivered += delivered
+        return delivered
+
+    def get_stats(self):
+        """الحصول على إحصائيات الناقل"""
+        with self._lock:
+            return {
+                'subscriptions': len(self._subscriptions),
+                'topics': len(self._topics),
+                'published': self.published,
+                'delivered': self.delivered,
+                'expired': self.expired,
+                'dropped': sum(sub.dropped for sub in self._subscriptions),
+            }
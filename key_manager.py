@@ -26,7 +26,7 @@ class KeyManager:
         """تحديد إزاحة قيصر جديدة"""
         if 1 <= shift <= 25:
             self.caesar_shift = shift
-            self.cipher.set_shift(shift)
+            self.cipher = self.cipher.with_shift(shift)
             return True
         return False
     
@@ -129,7 +129,7 @@ class KeyManager:
     def reset_to_default(self):
         """إعادة تعيين المفتاح للقيمة الافتراضية"""
         self.caesar_shift = self._get_default_shift()
-        self.cipher.set_shift(self.caesar_shift)
+        self.cipher = CaesarCipher(self.caesar_shift)
     
     def get_all_keys(self):
         """الحصول على جميع المفاتيح (للتوافق مع الكود القديم)"""
@@ -0,0 +1,505 @@
+"""ترحيلات مخطط قاعدة البيانات
+
+كل ترحيل له رقم إصدار ووصف وقائمة خطوات (جمل SQL أو دوال تستقبل الاتصال).
+يتم تتبع الإصدار المطبق في ``PRAGMA user_version`` وتطبيق الترحيلات المتبقية
+بالترتيب، كل ترحيل في معاملة مستقلة. يجب أن تكون الخطوات قابلة لإعادة التنفيذ
+بأمان (IF NOT EXISTS ...) لأن قواعد البيانات القديمة قد تحتوي الجداول مسبقاً.
+"""
+
+def _backfill_conversation_summaries(conn):
+    """بناء ملخصات المحادثات الموجودة من آخر رسالة في كل محادثة"""
+    # استيراد متأخر لتجنب الاستيراد الدائري مع database
+    from database import make_snippet
+    from encryption_utils import CaesarCipher
+
+    cipher = CaesarCipher()
+    rows = conn.execute("""
+        SELECT conversation_id, id, created_at, sender_id, content
+        FROM (
+            SELECT m.*, ROW_NUMBER() OVER (
+                PARTITION BY m.conversation_id
+                ORDER BY m.created_at DESC, m.rowid DESC
+            ) AS position
+            FROM messages m
+        )
+        WHERE position = 1
+    """).fetchall()
+
+    plaintexts = cipher.decrypt_many(row[4] for row in rows)
+    conn.executemany("""
+        INSERT OR IGNORE INTO conversation_summaries
+            (conversation_id, last_message_id, last_message_at, last_sender_id, snippet)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (conversation_id, message_id, created_at, sender_id, make_snippet(plaintext))
+        for (conversation_id, message_id, created_at, sender_id, _), plaintext in zip(rows, plaintexts)
+    ])
+
+
+def _rebuild_users_fts(conn):
+    """إعادة بناء فهرس البحث النصي للمستخدمين بنص موحد في بايثون"""
+    from user_search import rebuild_user_index
+
+    rebuild_user_index(conn)
+
+
+def _add_column(table, column, definition):
+    """خطوة ترحيل تضيف عموداً إذا لم يكن موجوداً"""
+    def step(conn):
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+def _merge_private_conversations(conn):
+    """حساب pair_key للمحادثات الخاصة ودمج المحادثات المكررة لنفس الزوج
+
+    تبقى أقدم محادثة لكل زوج، ويُنقل المشاركون وعدادات غير المقروء إليها
+    وتحذف المكررة. كل دمج يُسجل في conversation_merges حتى تنقل الرسائل
+    والملخصات بعد ذلك (قد تكون في ملفات الأجزاء).
+    """
+    rows = conn.execute("""
+        SELECT c.id, MIN(cp.user_id) || ':' || MAX(cp.user_id), c.updated_at
+        FROM conversations c
+        INNER JOIN conversation_participants cp ON cp.conversation_id = c.id
+        WHERE c.type = 'private'
+        GROUP BY c.id
+        HAVING COUNT(DISTINCT cp.user_id) <= 2
+        ORDER BY c.created_at, c.rowid
+    """).fetchall()
+
+    canonical = {}
+    for conversation_id, pair_key, updated_at in rows:
+        if pair_key not in canonical:
+            canonical[pair_key] = conversation_id
+            conn.execute("UPDATE conversations SET pair_key = ? WHERE id = ?",
+                         (pair_key, conversation_id))
+            continue
+
+        target_id = canonical[pair_key]
+        participants = conn.execute("""
+            SELECT user_id, unread_count FROM conversation_participants
+            WHERE conversation_id = ?
+        """, (conversation_id,)).fetchall()
+        for user_id, unread_count in participants:
+            moved = conn.execute("""
+                UPDATE conversation_participants SET unread_count = unread_count + ?
+                WHERE conversation_id = ? AND user_id = ?
+            """, (unread_count, target_id, user_id)).rowcount
+            if not moved:
+                conn.execute("""
+                    UPDATE conversation_participants SET conversation_id = ?
+                    WHERE conversation_id = ? AND user_id = ?
+                """, (target_id, conversation_id, user_id))
+
+        conn.execute("DELETE FROM conversation_participants WHERE conversation_id = ?",
+                     (conversation_id,))
+        conn.execute("""
+            UPDATE conversations SET updated_at = MAX(COALESCE(updated_at, ''), ?)
+            WHERE id = ?
+        """, (updated_at or '', target_id))
+        conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+        conn.execute("""
+            INSERT OR IGNORE INTO conversation_merges (duplicate_id, canonical_id)
+            VALUES (?, ?)
+        """, (conversation_id, target_id))
+
+
+MIGRATIONS = [
+    (1, "المخطط الأساسي", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            display_name TEXT NOT NULL,
+            avatar TEXT,
+            is_online BOOLEAN DEFAULT FALSE,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS friendships (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            friend_id TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (friend_id) REFERENCES users (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id TEXT PRIMARY KEY,
+            type TEXT DEFAULT 'private',
+            name TEXT,
+            avatar TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS conversation_participants (
+            id TEXT PRIMARY KEY,
+            conversation_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            role TEXT DEFAULT 'member',
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id TEXT PRIMARY KEY,
+            conversation_id TEXT NOT NULL,
+            sender_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            message_type TEXT DEFAULT 'text',
+            is_read BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id),
+            FOREIGN KEY (sender_id) REFERENCES users (id)
+        )
+        """,
+    ]),
+    (2, "فهارس الاستعلامات الرئيسية", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+        ON messages (conversation_id, created_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_participants_user_conversation
+        ON conversation_participants (user_id, conversation_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_participants_conversation_user
+        ON conversation_participants (conversation_id, user_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_friendships_user_friend_status
+        ON friendships (user_id, friend_id, status)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_friendships_friend_user_status
+        ON friendships (friend_id, user_id, status)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_conversations_updated_at
+        ON conversations (updated_at)
+        """,
+        "ANALYZE",
+    ]),
+    (3, "ملخصات المحادثات", [
+        """
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            conversation_id TEXT PRIMARY KEY,
+            last_message_id TEXT,
+            last_message_at TIMESTAMP,
+            last_sender_id TEXT,
+            snippet TEXT,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+        )
+        """,
+        _backfill_conversation_summaries,
+    ]),
+    (4, "فهرس البحث النصي للمستخدمين", [
+        # النص المفهرس موحد في بايثون (user_search.index_user) عند كل كتابة
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5 (
+            username, email, display_name,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS users_fts_after_delete AFTER DELETE ON users BEGIN
+            DELETE FROM users_fts WHERE rowid = old.rowid;
+        END
+        """,
+        _rebuild_users_fts,
+    ]),
+    (5, "علامات القراءة وعدادات غير المقروء", [
+        _add_column('conversation_participants', 'last_read_message_id', 'TEXT'),
+        _add_column('conversation_participants', 'last_read_at', 'TIMESTAMP'),
+        _add_column('conversation_participants', 'unread_count', 'INTEGER NOT NULL DEFAULT 0'),
+        # الرسائل السابقة تعتبر مقروءة لأن is_read لم يُستخدم أبداً
+        """
+        UPDATE conversation_participants
+        SET last_read_message_id = s.last_message_id,
+            last_read_at = s.last_message_at,
+            unread_count = 0
+        FROM conversation_summaries s
+        WHERE s.conversation_id = conversation_participants.conversation_id
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_participants_user_unread
+        ON conversation_participants (user_id, unread_count)
+        """,
+    ]),
+    (6, "مفتاح الزوج للمحادثات الخاصة", [
+        _add_column('conversations', 'pair_key', 'TEXT'),
+        # الرسائل تُنقل من المحادثات المدمجة عند بدء التشغيل (messages_moved)
+        """
+        CREATE TABLE IF NOT EXISTS conversation_merges (
+            duplicate_id TEXT PRIMARY KEY,
+            canonical_id TEXT NOT NULL,
+            merged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            messages_moved INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        _merge_private_conversations,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_pair_key
+        ON conversations (pair_key) WHERE pair_key IS NOT NULL
+        """,
+    ]),
+    (7, "صداقات متماثلة في الاتجاهين", [
+        # حذف الصفوف المكررة لنفس الاتجاه قبل إنشاء الفهرس الفريد
+        """
+        DELETE FROM friendships
+        WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM friendships GROUP BY user_id, friend_id
+        )
+        """,
+        # كل صداقة تُخزن في الاتجاهين حتى تصبح قائمة الأصدقاء مسحاً لنطاق واحد
+        """
+        INSERT INTO friendships (id, user_id, friend_id, status, created_at)
+        SELECT lower(hex(randomblob(16))), f.friend_id, f.user_id, f.status, f.created_at
+        FROM friendships f
+        WHERE NOT EXISTS (
+            SELECT 1 FROM friendships r
+            WHERE r.user_id = f.friend_id AND r.friend_id = f.user_id
+        )
+        """,
+        "DROP INDEX IF EXISTS idx_friendships_user_friend_status",
+        "DROP INDEX IF EXISTS idx_friendships_friend_user_status",
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_friendships_user_friend
+        ON friendships (user_id, friend_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_friendships_user_status_friend
+        ON friendships (user_id, status, friend_id)
+        """,
+        "ANALYZE friendships",
+    ]),
+    (8, "أرقام تسلسل الرسائل وإصدار المحادثة", [
+        _add_column('messages', 'seq', 'INTEGER'),
+        """
+        UPDATE messages SET seq = numbered.position
+        FROM (
+            SELECT rowid AS message_rowid, ROW_NUMBER() OVER (
+                PARTITION BY conversation_id ORDER BY created_at, rowid
+            ) AS position
+            FROM messages
+        ) AS numbered
+        WHERE messages.rowid = numbered.message_rowid
+        """,
+        # إصدار المحادثة = رقم تسلسل آخر رسالة فيها
+        _add_column('conversation_summaries', 'seq', 'INTEGER NOT NULL DEFAULT 0'),
+        """
+        UPDATE conversation_summaries SET seq = (
+            SELECT COALESCE(MAX(m.seq), 0) FROM messages m
+            WHERE m.conversation_id = conversation_summaries.conversation_id
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_seq
+        ON messages (conversation_id, seq)
+        """,
+    ]),
+    (9, "جلسات الدخول وإعدادات التطبيق", [
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            expires_at INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_sessions_user_expires
+        ON sessions (user_id, expires_at)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS app_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+    ]),
+    (10, "فهرسة المستخدمين بدون دوال SQL مخصصة", [
+        # المشغلات القديمة تستدعي search_normalize غير الموجودة خارج التطبيق
+        "DROP TRIGGER IF EXISTS users_fts_after_insert",
+        "DROP TRIGGER IF EXISTS users_fts_after_update",
+        _rebuild_users_fts,
+    ]),
+    (11, "علامات القراءة بجانب الرسائل", [
+        # عداد غير المقروء = رقم تسلسل آخر رسالة ناقص last_read_seq، والجدول في
+        # جزء المحادثة حتى لا يكتب إرسال الرسائل في القاعدة الرئيسية. البيانات
+        # القديمة تنقلها DatabaseManager._move_read_state
+        """
+        CREATE TABLE IF NOT EXISTS conversation_reads (
+            conversation_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            last_read_seq INTEGER NOT NULL DEFAULT 0,
+            last_read_message_id TEXT,
+            last_read_at TIMESTAMP,
+            PRIMARY KEY (conversation_id, user_id)
+        ) WITHOUT ROWID
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# الاستعلامات الأكثر تكراراً مع معاملات تجريبية للتحقق من خطط التنفيذ
+HOT_QUERIES = {
+    # نفس استعلامات الصفحات في DatabaseManager.get_conversation_messages_page
+    'conversation_messages': ("""
+        SELECT m.id FROM messages m
+        WHERE m.conversation_id = ?
+        ORDER BY m.created_at DESC, m.rowid DESC
+        LIMIT 51
+    """, ('x',)),
+    'conversation_messages_before': ("""
+        SELECT m.id FROM messages m
+        WHERE m.conversation_id = ? AND (m.created_at, m.rowid) < (?, ?)
+        ORDER BY m.created_at DESC, m.rowid DESC
+        LIMIT 51
+    """, ('x', '2024-01-01 00:00:00', 1)),
+    'conversation_messages_after': ("""
+        SELECT m.id FROM messages m
+        WHERE m.conversation_id = ? AND (m.created_at, m.rowid) > (?, ?)
+        ORDER BY m.created_at ASC, m.rowid ASC
+        LIMIT 51
+    """, ('x', '2024-01-01 00:00:00', 1)),
+    'messages_since': ("""
+        SELECT m.id FROM messages m
+        WHERE m.conversation_id = ? AND m.seq > ?
+        ORDER BY m.seq
+        LIMIT 50
+    """, ('x', 0)),
+    'find_private_conversation': ("""
+        SELECT c.id FROM conversations c
+        WHERE c.pair_key = ?
+    """, ('x:y',)),
+    'user_friends': ("""
+        SELECT u.id
+        FROM friendships f
+        INNER JOIN users u ON u.id = f.friend_id
+        WHERE f.user_id = ? AND f.status = 'accepted' AND f.friend_id != f.user_id
+    """, ('x',)),
+    'search_users': ("""
+        SELECT u.id
+        FROM users_fts
+        INNER JOIN users u ON u.rowid = users_fts.rowid
+        WHERE users_fts MATCH ? AND u.id != ?
+        ORDER BY bm25(users_fts, 3.0, 1.0, 2.0)
+        LIMIT 20
+    """, ('"x"*', 'x')),
+    'unread_count': ("""
+        SELECT COALESCE(SUM(MAX(s.seq - COALESCE(r.last_read_seq, 0), 0)), 0)
+        FROM conversation_participants cp
+        INNER JOIN conversation_summaries s ON s.conversation_id = cp.conversation_id
+        LEFT JOIN conversation_reads r
+               ON r.conversation_id = cp.conversation_id AND r.user_id = cp.user_id
+        WHERE cp.user_id = ?
+    """, ('x',)),
+    'user_conversations': ("""
+        SELECT c.id, s.snippet, u.display_name
+        FROM conversation_participants cp
+        INNER JOIN conversations c ON c.id = cp.conversation_id
+        LEFT JOIN conversation_summaries s ON s.conversation_id = c.id
+        LEFT JOIN conversation_reads r
+               ON r.conversation_id = c.id AND r.user_id = cp.user_id
+        LEFT JOIN conversation_participants op
+               ON op.conversation_id = c.id AND op.user_id != cp.user_id
+        LEFT JOIN users u ON u.id = op.user_id
+        WHERE cp.user_id = ?
+        GROUP BY c.id
+        ORDER BY COALESCE(s.last_message_at, c.updated_at) DESC
+    """, ('x',)),
+}
+
+
+def get_schema_version(conn):
+    """الحصول على إصدار المخطط المخزن"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn, migrations=None):
+    """تطبيق الترحيلات غير المطبقة بالترتيب
+
+    يجب أن يكون الاتصال في وضع autocommit. يعيد قائمة أرقام الإصدارات التي
+    تم تطبيقها.
+    """
+    if migrations is None:
+        # المسار السريع عند بدء التشغيل: المخطط محدث بالفعل
+        if get_schema_version(conn) >= LATEST_VERSION:
+            return []
+        migrations = MIGRATIONS
+
+    applied = []
+    for version, description, steps in sorted(migrations, key=lambda m: m[0]):
+        if get_schema_version(conn) >= version:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # إعادة التحقق بعد أخذ القفل في حال طبقته عملية أخرى
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def explain_query_plan(conn, sql, params=()):
+    """الحصول على خطة تنفيذ استعلام كقائمة نصوص"""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[3] for row in rows]
+
+
+def is_full_scan(detail):
+    """هل يمثل سطر الخطة مسحاً كاملاً للجدول؟"""
+    return detail.startswith("SCAN ") and " INDEX " not in f"{detail} "
+
+
+def check_query_plans(conn, queries=None):
+    """التحقق من أن الاستعلامات الرئيسية تستخدم الفهارس
+
+    يعيد قاموساً لكل استعلام يحتوي خطة التنفيذ وقائمة المسوحات الكاملة.
+    """
+    if queries is None:
+        queries = HOT_QUERIES
+
+    report = {}
+    for name, (sql, params) in queries.items():
+        plan = explain_query_plan(conn, sql, params)
+        full_scans = [detail for detail in plan if is_full_scan(detail)]
+        report[name] = {
+            'plan': plan,
+            'full_scans': full_scans,
+            'uses_index': any("INDEX" in detail for detail in plan),
+            'ok': not full_scans,
+        }
+    return report
@@ -1,22 +1,54 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Sequence
 
-@dataclass
-class User:
+class DictAccessMixin:
+    """وصول بأسلوب القاموس لحقول النماذج (user['id'] و user.get('avatar'))
+    
+    يسمح للواجهة بالاستمرار في التعامل مع النتائج كقواميس بينما تبقى الكائنات
+    مضغوطة باستخدام __slots__.
+    """
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        if key not in self.__dataclass_fields__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key not in self.__dataclass_fields__:
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def __contains__(self, key):
+        return key in self.__dataclass_fields__
+    
+    def get(self, key, default=None):
+        if key not in self.__dataclass_fields__:
+            return default
+        return getattr(self, key)
+    
+    def keys(self):
+        return list(self.__dataclass_fields__)
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__dataclass_fields__}
+
+@dataclass(slots=True)
+class User(DictAccessMixin):
     """نموذج المستخدم"""
     id: str
     username: str
-    email: str
-    display_name: str
+    email: Optional[str] = None
+    display_name: str = ""
     password_hash: Optional[str] = None
     avatar: Optional[str] = None
     is_online: bool = False
     last_seen: Optional[datetime] = None
     created_at: Optional[datetime] = None
 
-@dataclass
-class Friendship:
+@dataclass(slots=True)
+class Friendship(DictAccessMixin):
     """نموذج الصداقة"""
     id: str
     user_id: str
@@ -24,8 +56,8 @@ class Friendship:
     status: str = "accepted"  # pending, accepted, blocked
     created_at: Optional[datetime] = None
 
-@dataclass
-class Conversation:
+@dataclass(slots=True)
+class Conversation(DictAccessMixin):
     """نموذج المحادثة"""
     id: str
     type: str = "private"  # private, group
@@ -33,9 +65,15 @@ class Conversation:
     avatar: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    # ملخص آخر رسالة وحالة القراءة (قائمة المحادثات)
+    last_message: Optional[str] = None
+    last_message_id: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+    last_sender_id: Optional[str] = None
+    unread_count: int = 0
 
-@dataclass
-class ConversationParticipant:
+@dataclass(slots=True)
+class ConversationParticipant(DictAccessMixin):
     """نموذج مشارك المحادثة"""
     id: str
     conversation_id: str
@@ -43,19 +81,70 @@ class ConversationParticipant:
     role: str = "member"  # member, admin
     joined_at: Optional[datetime] = None
 
-@dataclass
-class Message:
+@dataclass(slots=True)
+class Message(DictAccessMixin):
     """نموذج الرسالة"""
     id: str
     conversation_id: str
     sender_id: str
     content: str
     message_type: str = "text"  # text, file, image
+    created_at: Optional[datetime] = None
+    # معلومات المرسل ومؤشر الصفحة (نتائج الاستعلامات)
+    sender_username: Optional[str] = None
+    sender_name: Optional[str] = None
+    cursor: Optional[str] = None
+    seq: Optional[int] = None  # رقم تسلسل الرسالة داخل المحادثة
     is_read: bool = False
     is_encrypted: bool = True  # تلقائياً مشفرة
-    created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+def model_row_factory(model_cls):
+    """إنشاء row_factory لـ sqlite3 يحول الصفوف إلى كائنات النموذج
+    
+    إذا كانت أعمدة الاستعلام بنفس ترتيب حقول النموذج يُبنى الكائن بالمعاملات
+    الموضعية مباشرة، وإلا بالأسماء. يجب إنشاء مصنع جديد لكل مؤشر (cursor).
+    """
+    field_names = tuple(f.name for f in fields(model_cls))
+    state = {'description': None, 'names': None, 'positional': False}
+    
+    def factory(cursor, row):
+        description = cursor.description
+        if description is not state['description']:
+            names = tuple(column[0] for column in description)
+            state['description'] = description
+            state['names'] = names
+            state['positional'] = names == field_names[:len(names)]
+        if state['positional']:
+            return model_cls(*row)
+        return model_cls(**dict(zip(state['names'], row)))
+    
+    return factory
+
+class LazyRows(Sequence):
+    """عرض كسول لنتائج كبيرة: يحتفظ بالصفوف الخام ويبني الكائن عند الوصول إليه"""
+    __slots__ = ('_rows', '_factory')
+    
+    def __init__(self, rows: Sequence, factory: Callable):
+        self._rows = rows
+        self._factory = factory
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyRows(self._rows[index], self._factory)
+        return self._factory(self._rows[index])
+    
+    def __iter__(self):
+        factory = self._factory
+        for row in self._rows:
+            yield factory(row)
+    
+    def __repr__(self):
+        return f"LazyRows({len(self._rows)} rows)"
+
 @dataclass
 class EncryptionInfo:
     """معلومات التشفير"""
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from env_config import get_env_float, get_env_int
+
+# حدود عامل التكلفة المقبولة عند المعايرة التلقائية
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+
+class HasherBusyError(Exception):
+    """طابور عمليات bcrypt ممتلئ"""
+
+
+def get_hash_rounds(hashed):
+    """قراءة عامل التكلفة من تجزئة bcrypt ($2b$12$...)، None إذا كانت غير صالحة"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def calibrate_rounds(target_ms, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS):
+    """اختيار أكبر عامل تكلفة لا يتجاوز زمن تجزئته ``target_ms``
+
+    كل زيادة في العامل تضاعف الزمن، لذلك يكفي قياس أقل عامل مرة واحدة.
+    """
+    start = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(min_rounds))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        elapsed_ms *= 2
+        rounds += 1
+    return rounds
+
+
+class PasswordHasher:
+    """تنفيذ bcrypt في مجمع خيوط محدود بعيداً عن خيوط الواجهة
+
+    bcrypt يحرر GIL أثناء الحساب، لذلك لا تتوقف بقية الجلسات أثناء موجة
+    تسجيلات دخول. عدد العمليات المعلقة محدود: عند امتلاء الطابور يُرفض الطلب
+    فوراً بـ HasherBusyError، وعند تجاوز المهلة يُرفع TimeoutError.
+    """
+
+    def __init__(self, rounds=None, max_workers=None, max_pending=None, timeout=None):
+        if rounds is None:
+            rounds = self._get_default_rounds()
+        if max_workers is None:
+            max_workers = get_env_int("BCRYPT_WORKERS", min(4, os.cpu_count() or 1))
+        if max_pending is None:
+            max_pending = get_env_int("BCRYPT_MAX_PENDING", max_workers * 8)
+        if timeout is None:
+            timeout = get_env_float("BCRYPT_TIMEOUT", 10.0)
+
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)  # زمن العمليات الأخيرة بالمللي ثانية
+        self.operations = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_default_rounds(self):
+        """عامل التكلفة من BCRYPT_ROUNDS، أو معايرة تلقائية إذا كانت قيمته auto"""
+        value = os.getenv("BCRYPT_ROUNDS", "12")
+        if value.strip().lower() == "auto":
+            return calibrate_rounds(get_env_float("BCRYPT_TARGET_MS", 250.0))
+        try:
+            rounds = int(value)
+            return rounds if 4 <= rounds <= 31 else 12
+        except ValueError:
+            return 12
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.operations += 1
+                self._latencies.append(elapsed_ms)
+
+    def _run(self, func, *args):
+        """تنفيذ عملية في المجمع وانتظار نتيجتها"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusyError("Password hashing queue is full")
+
+        future = self._executor.submit(self._timed, func, *args)
+        # المكان يُحرر عند انتهاء العملية فعلياً وليس عند انتهاء المهلة
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def hash(self, password):
+        """تجزئة كلمة مرور بعامل التكلفة الحالي"""
+        hashed = self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+        return hashed.decode('utf-8')
+
+    def verify(self, password, hashed):
+        """التحقق من كلمة مرور مقابل تجزئة مخزنة"""
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        """هل التجزئة بعامل تكلفة أقل من الحالي؟"""
+        rounds = get_hash_rounds(hashed)
+        return rounds is not None and rounds < self.rounds
+
+    def get_stats(self):
+        """الحصول على إحصائيات التجزئة مع زمن p50/p99"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                'rounds': self.rounds,
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'operations': self.operations,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'p50_ms': None,
+                'p99_ms': None,
+            }
+        if latencies:
+            stats['p50_ms'] = latencies[int(0.50 * (len(latencies) - 1))]
+            stats['p99_ms'] = latencies[int(0.99 * (len(latencies) - 1))]
+        return stats
+
+    def close(self):
+        """إيقاف مجمع الخيوط"""
+        self._executor.shutdown(wait=True)
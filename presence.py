@@ -0,0 +1,183 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def _format_timestamp(ts):
+    """تنسيق وقت يونكس بنفس صيغة CURRENT_TIMESTAMP في SQLite"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _parse_timestamp(value):
+    """تحويل قيمة last_seen المخزنة إلى وقت يونكس"""
+    try:
+        dt = datetime.strptime(str(value)[:19], '%Y-%m-%d %H:%M:%S')
+        return dt.replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class PresenceTracker:
+    """تتبع حالة اتصال المستخدمين في الذاكرة مع كتابة مؤجلة إلى قاعدة البيانات
+
+    كل إعادة تشغيل للسكربت تسجل نبضة في الذاكرة فقط. خيط خلفي واحد يكتب
+    التغييرات المتراكمة على دفعات كل ``flush_interval`` ثانية، ويعتبر المستخدم
+    غير متصل إذا لم تصل منه نبضة خلال ``idle_timeout`` ثانية.
+    """
+
+    def __init__(self, db, flush_interval=15.0, idle_timeout=120.0, autostart=True):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._last_beat = {}   # user_id -> وقت آخر نبضة
+        self._online = set()
+        self._dirty = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # الإحصائيات
+        self.heartbeats = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+        if autostart:
+            self.start()
+
+    def start(self):
+        """تشغيل خيط الكتابة الخلفي"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="presence-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """إيقاف الخيط الخلفي مع كتابة التغييرات المتبقية"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing presence: {e}")
+
+    def heartbeat(self, user_id):
+        """تسجيل نبضة من مستخدم متصل"""
+        now = time.time()
+        with self._lock:
+            self.heartbeats += 1
+            self._last_beat[user_id] = now
+            self._online.add(user_id)
+            self._dirty.add(user_id)
+
+    def disconnect(self, user_id):
+        """تسجيل خروج المستخدم فوراً"""
+        with self._lock:
+            self._last_beat[user_id] = time.time()
+            self._online.discard(user_id)
+            self._dirty.add(user_id)
+
+    def _expire_idle(self, now):
+        """تحويل المستخدمين الخاملين إلى غير متصلين (يُستدعى مع القفل)"""
+        for user_id in list(self._online):
+            if now - self._last_beat[user_id] > self.idle_timeout:
+                self._online.discard(user_id)
+                self._dirty.add(user_id)
+
+    def flush(self):
+        """كتابة التغييرات المتراكمة إلى قاعدة البيانات في معاملة واحدة"""
+        now = time.time()
+        with self._lock:
+            self._expire_idle(now)
+            dirty = self._dirty
+            self._dirty = set()
+            updates = [
+                (user_id in self._online, _format_timestamp(self._last_beat[user_id]), user_id)
+                for user_id in dirty
+            ]
+            # المستخدمون غير المتصلين بعد كتابة حالتهم لم تعد هناك حاجة لتتبعهم
+            for user_id in dirty:
+                if user_id not in self._online:
+                    del self._last_beat[user_id]
+
+        if not updates:
+            return 0
+
+        try:
+            self.db.update_users_presence(updates)
+        except Exception:
+            # إعادة التحديثات لمحاولة لاحقة ما لم تصل نبضة أحدث
+            with self._lock:
+                for is_online, last_seen, user_id in updates:
+                    if user_id not in self._last_beat:
+                        self._last_beat[user_id] = _parse_timestamp(last_seen) or now
+                    self._dirty.add(user_id)
+            raise
+
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += len(updates)
+        return len(updates)
+
+    def is_online(self, user_id):
+        """هل المستخدم متصل حالياً؟ (None إذا لم يكن متتبعاً في هذه العملية)"""
+        now = time.time()
+        with self._lock:
+            last_beat = self._last_beat.get(user_id)
+            if last_beat is None:
+                return None
+            return user_id in self._online and now - last_beat <= self.idle_timeout
+
+    def get_presence(self, user_ids):
+        """الحصول على حالة عدة مستخدمين دفعة واحدة من الذاكرة"""
+        now = time.time()
+        presence = {}
+        with self._lock:
+            for user_id in user_ids:
+                last_beat = self._last_beat.get(user_id)
+                if last_beat is None:
+                    continue
+                presence[user_id] = {
+                    'is_online': user_id in self._online and now - last_beat <= self.idle_timeout,
+                    'last_seen': _format_timestamp(last_beat)
+                }
+        return presence
+
+    def apply(self, users):
+        """تحديث is_online و last_seen في صفوف المستخدمين من الذاكرة
+
+        المستخدمون غير المتتبعين تبقى قيمهم من قاعدة البيانات، لكن يُعتبرون غير
+        متصلين إذا كانت آخر نبضة مكتوبة أقدم من ``idle_timeout`` (مثلاً بعد
+        إعادة تشغيل العملية دون تسجيل خروج).
+        """
+        presence = self.get_presence([user['id'] for user in users])
+        now = time.time()
+        for user in users:
+            state = presence.get(user['id'])
+            if state is not None:
+                user['is_online'] = state['is_online']
+                user['last_seen'] = state['last_seen']
+            elif user.get('is_online'):
+                last_seen = _parse_timestamp(user.get('last_seen'))
+                if last_seen is None or now - last_seen > self.idle_timeout + self.flush_interval:
+                    user['is_online'] = False
+        return users
+
+    def get_stats(self):
+        """الحصول على إحصائيات التتبع"""
+        with self._lock:
+            return {
+                'tracked_users': len(self._last_beat),
+                'online_users': len(self._online),
+                'pending_writes': len(self._dirty),
+                'heartbeats': self.heartbeats,
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+            }
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+
+
+class ProfileCache:
+    """ذاكرة مؤقتة (LRU مع مدة صلاحية) لملفات المستخدمين
+
+    الملفات مخزنة حسب المعرف مع فهارس لاسم المستخدم والبريد الإلكتروني.
+    كل تعديل على المستخدم يحذف ملفه، وتُهمل نتيجة أي قراءة تزامنت مع حذف
+    (نفس أسلوب ``generation`` في ذاكرة البحث).
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (user, وقت الانتهاء)
+        self._by_username = {}
+        self._by_email = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, column, value):
+        """البحث عن ملف بعمود (id أو username أو email)، يعيد None عند عدم التوفر"""
+        with self._lock:
+            if column == 'id':
+                user_id = value
+            elif column == 'username':
+                user_id = self._by_username.get(value)
+            else:
+                user_id = self._by_email.get(value)
+
+            entry = self._entries.get(user_id) if user_id is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self._remove(user_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            # نسخة حتى لا يؤثر تعديل النتيجة على الذاكرة المؤقتة
+            return replace(user)
+
+    def put(self, user, generation):
+        """تخزين ملف مستخدم، ``generation`` هو قيمة ``self.generation`` قبل الاستعلام"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._remove(user.id)
+            self._entries[user.id] = (replace(user), time.monotonic() + self.ttl)
+            self._by_username[user.username] = user.id
+            if user.email:
+                self._by_email[user.email] = user.id
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def _remove(self, user_id):
+        """حذف ملف وفهارسه (يُستدعى مع القفل)"""
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        user = entry[0]
+        if self._by_username.get(user.username) == user_id:
+            del self._by_username[user.username]
+        if user.email and self._by_email.get(user.email) == user_id:
+            del self._by_email[user.email]
+
+    def invalidate(self, user_ids):
+        """حذف ملفات مستخدمين بعد تعديلها"""
+        with self._lock:
+            self.generation += 1
+            for user_id in user_ids:
+                self._remove(user_id)
+            self.invalidations += 1
+
+    def clear(self):
+        """حذف جميع الملفات"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._by_username.clear()
+            self._by_email.clear()
+
+    def get_stats(self):
+        """الحصول على إحصائيات الذاكرة المؤقتة"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
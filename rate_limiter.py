@@ -0,0 +1,153 @@
+import threading
+import time
+
+from env_config import get_env_float
+
+
+class TokenBucket:
+    """دلو رموز: ``rate`` رمز في الثانية بحد أقصى ``capacity``"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+
+class RateLimitedError(Exception):
+    """تجاوز ميزانية محاولات التحقق من كلمة المرور"""
+
+
+class BucketTable:
+    """دلاء المفاتيح (حسابات أو عملاء) بعدد محدود، تُستخدم مع قفل المحدد
+
+    المفتاح غير المتتبع يعامل كدلو ممتلئ، لذلك لا يُخزن إلا عند استهلاك رمز
+    منه فعلاً، ولا يُحذف إلا دلو امتلأ من جديد (حذفه لا يغير شيئاً). إذا كانت
+    كل الدلاء المتتبعة ما زالت تمتلئ يُرفض المفتاح الجديد حتى يمتلئ أحدها،
+    فلا يمكن لمفاتيح عشوائية إخراج دلو حساب مستنزف.
+    """
+
+    def __init__(self, rate, capacity, max_keys):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.buckets = {}
+        self._next_sweep = 0.0
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def tokens(self, key, now):
+        """الرموز المتاحة للمفتاح بدون تخزينه"""
+        bucket = self.buckets.get(key)
+        return self.capacity if bucket is None else bucket.refill(now)
+
+    def has_room(self, key, now):
+        """هل يمكن تخزين دلو المفتاح (متتبع بالفعل أو يوجد مكان له)"""
+        if key in self.buckets or len(self.buckets) < self.max_keys:
+            return True
+        return self._sweep(now)
+
+    def take(self, key, now):
+        """استهلاك رمز من دلو المفتاح (بعد التحقق بـ tokens و has_room)"""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.capacity, now)
+        bucket.tokens -= 1
+
+    def _sweep(self, now):
+        """حذف الدلاء التي امتلأت، يعيد True إذا أصبح هناك مكان
+
+        إذا لم يمتلئ أي دلو لا يُعاد المسح قبل أن يمتلئ أقربها.
+        """
+        if now < self._next_sweep:
+            return False
+        soonest = None
+        for key, bucket in list(self.buckets.items()):
+            missing = bucket.capacity - bucket.refill(now)
+            if missing <= 0:
+                del self.buckets[key]
+            else:
+                wait = missing / bucket.rate
+                soonest = wait if soonest is None else min(soonest, wait)
+        if len(self.buckets) < self.max_keys:
+            return True
+        self._next_sweep = now + soonest
+        return False
+
+
+class LoginRateLimiter:
+    """ميزانية عمليات التحقق من كلمات المرور لكل حساب ولكل عميل وللخادم كله
+
+    كل عملية bcrypt (بما فيها التحقق الوهمي عند عدم وجود المستخدم) تستهلك رمزاً
+    من الدلاء الثلاثة معاً، وعند نفاد أي منها يُرفض الطلب قبل أي عملية تجزئة.
+    الطلب المرفوض لا يخزن أي مفتاح، وعدد الحسابات والعملاء المتتبعين محدود
+    (انظر BucketTable).
+    """
+
+    def __init__(self, account_per_minute=None, client_per_minute=None,
+                 global_per_second=None, max_keys=10000):
+        if account_per_minute is None:
+            account_per_minute = get_env_float("LOGIN_ACCOUNT_PER_MINUTE", 5.0)
+        if client_per_minute is None:
+            client_per_minute = get_env_float("LOGIN_CLIENT_PER_MINUTE", 20.0)
+        if global_per_second is None:
+            global_per_second = get_env_float("LOGIN_GLOBAL_PER_SECOND", 20.0)
+
+        self.max_keys = max_keys
+
+        self._lock = threading.Lock()
+        self._accounts = BucketTable(account_per_minute / 60.0, max(1.0, account_per_minute), max_keys)
+        self._clients = BucketTable(client_per_minute / 60.0, max(1.0, client_per_minute), max_keys)
+        self._global = TokenBucket(global_per_second, max(1.0, global_per_second * 2), time.monotonic())
+
+        self.allowed = 0
+        self.rejected_account = 0
+        self.rejected_client = 0
+        self.rejected_global = 0
+
+    def acquire(self, account, client=None):
+        """حجز رمز لعملية تحقق واحدة، يعيد False إذا تجاوز الطلب الميزانية
+
+        الميزانيات تُفحص كلها قبل تخزين أي مفتاح، والرموز تُستهلك فقط عند القبول.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if client is not None and (self._clients.tokens(client, now) < 1
+                                       or not self._clients.has_room(client, now)):
+                self.rejected_client += 1
+                return False
+
+            if self._global.refill(now) < 1:
+                self.rejected_global += 1
+                return False
+
+            if (self._accounts.tokens(account, now) < 1
+                    or not self._accounts.has_room(account, now)):
+                self.rejected_account += 1
+                return False
+
+            self._accounts.take(account, now)
+            if client is not None:
+                self._clients.take(client, now)
+            self._global.tokens -= 1
+            self.allowed += 1
+            return True
+
+    def get_stats(self):
+        """الحصول على عدادات المحدد"""
+        with self._lock:
+            return {
+                'allowed': self.allowed,
+                'rejected_account': self.rejected_account,
+                'rejected_client': self.rejected_client,
+                'rejected_global': self.rejected_global,
+                'tracked_accounts': len(self._accounts),
+                'tracked_clients': len(self._clients),
+            }
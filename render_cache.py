@@ -0,0 +1,83 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+class RenderCache:
+    """ذاكرة مؤقتة مشتركة لأجزاء HTML الجاهزة للرسائل
+
+    الرسائل لا تتغير بعد تخزينها، لذلك يتم فك التشفير والتنظيف مرة واحدة عند
+    أول عرض. المفتاح يتضمن إصدار التشفير حتى لا تُستخدم نتيجة فك تشفير
+    بمفتاح مختلف. الحجم محدود بعدد العناصر وبعدد البايتات معاً.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(value):
+        if isinstance(value, tuple):
+            return sum(sys.getsizeof(part) for part in value)
+        return sys.getsizeof(value)
+
+    def get(self, key):
+        """الحصول على قيمة مخزنة، يعيد None عند عدم التوفر"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """تخزين قيمة مع إخراج الأقدم استخداماً عند تجاوز الحدود"""
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """إعادة القيمة المخزنة أو حسابها بـ ``render()`` وتخزينها"""
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """حذف جميع القيم (مثلاً عند تغيير مفتاح التشفير)"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        """الحصول على إحصائيات الذاكرة المؤقتة"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from auth import AuthManager
+from chat_manager import ChatManager
+from database import DatabaseManager
+from event_bus import EventBus
+from encryption_utils import CaesarCipher
+from key_manager import KeyManager
+from password_hasher import PasswordHasher
+from presence import PresenceTracker
+from rate_limiter import LoginRateLimiter
+from render_cache import RenderCache
+from sessions import SessionManager
+
+
+class Services:
+    """حاوية الخدمات المشتركة: مستودع بيانات واحد يُمرر لجميع المديرين
+
+    كل المديرين يستخدمون نفس DatabaseManager، لذلك يُهيأ المخطط ومجمع
+    الاتصالات والذاكرة المؤقتة مرة واحدة فقط في كل عملية.
+    """
+
+    def __init__(self, db=None, presence=None):
+        start = time.perf_counter()
+
+        self.db = db if db is not None else DatabaseManager()
+        db_ready = time.perf_counter()
+
+        self.presence = presence if presence is not None else PresenceTracker(self.db)
+        self.events = EventBus()
+        self.hasher = PasswordHasher()
+        self.limiter = LoginRateLimiter()
+        self.sessions = SessionManager(self.db)
+        self.auth = AuthManager(db=self.db, hasher=self.hasher, limiter=self.limiter,
+                                sessions=self.sessions)
+        self.chat = ChatManager(db=self.db, presence=self.presence, events=self.events)
+        self.key = KeyManager()
+        self.encryption = CaesarCipher()
+        # أجزاء HTML للرسائل مشتركة بين كل الجلسات
+        self.render_cache = RenderCache()
+
+        end = time.perf_counter()
+        self.startup_stats = {
+            'total_ms': (end - start) * 1000,
+            'database_ms': (db_ready - start) * 1000,
+            'managers_ms': (end - db_ready) * 1000,
+            **self.db.startup_stats,
+        }
+
+    def as_dict(self):
+        """المديرون بنفس المفاتيح التي تستخدمها الواجهة"""
+        return {
+            'auth': self.auth,
+            'db': self.db,
+            'presence': self.presence,
+            'events': self.events,
+            'encryption': self.encryption,
+            'chat': self.chat,
+            'key': self.key,
+            'render_cache': self.render_cache,
+            'sessions': self.sessions,
+        }
+
+    def close(self):
+        """إيقاف الخدمات وإغلاق الاتصالات"""
+        self.presence.stop()
+        self.hasher.close()
+        self.db.close()
+
+
+_services = None
+_services_lock = threading.Lock()
+
+
+def get_services():
+    """الحصول على حاوية الخدمات المشتركة للعملية (تُنشأ عند أول استدعاء)"""
+    global _services
+    if _services is None:
+        with _services_lock:
+            if _services is None:
+                _services = Services()
+    return _services
@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+
+class SessionManager:
+    """رموز جلسات موقعة ومحددة المدة لاستئناف الدخول بدون bcrypt
+
+    الرمز من الشكل ``session_id.expires_at.signature`` حيث التوقيع HMAC-SHA256
+    على المعرف ووقت الانتهاء. الرموز المزورة أو المنتهية تُرفض بدون أي
+    استعلام، والرموز الصالحة تُطابق مع جدول sessions (مفتاح أساسي) حتى يمكن
+    إلغاؤها عند تسجيل الخروج أو تغيير كلمة المرور.
+    """
+
+    def __init__(self, db, secret=None, ttl=None):
+        self.db = db
+        if secret is None:
+            # من البيئة، أو سر عشوائي يُحفظ في قاعدة البيانات ليبقى بعد إعادة التشغيل
+            secret = os.getenv("SESSION_SECRET") or db.get_or_create_setting(
+                "session_secret", secrets.token_hex(32)
+            )
+        if ttl is None:
+            ttl = self._get_default_ttl()
+        self._secret = secret.encode('utf-8')
+        self.ttl = ttl
+
+    def _get_default_ttl(self):
+        """مدة الجلسة بالثواني من SESSION_TTL_DAYS (افتراضياً 7 أيام)"""
+        try:
+            days = float(os.getenv("SESSION_TTL_DAYS", "7"))
+            return int(days * 86400) if days > 0 else 7 * 86400
+        except ValueError:
+            return 7 * 86400
+
+    def _sign(self, session_id, expires_at):
+        digest = hmac.new(self._secret, f"{session_id}.{expires_at}".encode('utf-8'),
+                          hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+    def issue(self, user_id):
+        """إنشاء جلسة جديدة للمستخدم وإعادة رمزها"""
+        session_id = secrets.token_hex(16)
+        expires_at = int(time.time()) + self.ttl
+        self.db.create_session(session_id, user_id, expires_at)
+        return f"{session_id}.{expires_at}.{self._sign(session_id, expires_at)}"
+
+    def _parse(self, token):
+        """التحقق من توقيع الرمز وصلاحيته، يعيد معرف الجلسة أو None"""
+        try:
+            session_id, expires_at, signature = token.split('.')
+            expires_at = int(expires_at)
+        except (AttributeError, ValueError):
+            return None
+        # مقارنة بايتات لأن compare_digest يرفض النصوص غير ASCII برمي TypeError
+        expected = self._sign(session_id, expires_at).encode('ascii')
+        if not hmac.compare_digest(signature.encode('utf-8'), expected):
+            return None
+        if expires_at <= time.time():
+            return None
+        return session_id
+
+    def validate(self, token):
+        """الحصول على معرف المستخدم صاحب الرمز، أو None إذا كان غير صالح أو ملغى"""
+        session_id = self._parse(token)
+        if session_id is None:
+            return None
+        session = self.db.get_session(session_id)
+        if session is None or session[1] <= time.time():
+            return None
+        return session[0]
+
+    def revoke(self, token):
+        """إلغاء جلسة الرمز (تسجيل الخروج)"""
+        session_id = self._parse(token)
+        if session_id is not None:
+            self.db.delete_session(session_id)
+
+    def revoke_user(self, user_id):
+        """إلغاء جميع جلسات المستخدم (مثلاً بعد تغيير كلمة المرور)"""
+        return self.db.delete_user_sessions(user_id)
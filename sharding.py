@@ -0,0 +1,223 @@
+"""تقسيم تخزين الرسائل على عدة ملفات SQLite
+
+الرسائل وملخصات المحادثات وعلامات القراءة توزع على N ملف حسب تجزئة معرف المحادثة، بينما
+تبقى جداول المستخدمين والصداقات ودليل المحادثات في قاعدة البيانات الرئيسية.
+كل ملف له قفل كتابة مستقل، لذلك تتوازى عمليات إدراج الرسائل بين الأجزاء.
+
+أداة سطر الأوامر:
+
+    python sharding.py rebalance --db secure_chat.db --from 0 --to 4
+    python sharding.py bench --shards 1 2 4 --threads 8
+    python sharding.py bench --shards 1 2 4 8 --io-latency-ms 2
+
+يجب إيقاف التطبيق أثناء إعادة التوزيع.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+# الجداول التي تنتقل مع المحادثة بين الأجزاء
+SHARDED_TABLES = ('messages', 'conversation_summaries', 'conversation_reads')
+
+# الجداول التي يُقاس عليها زمن التخزين في القياس: جداول الأجزاء ودليل المحادثات
+BENCH_LATENCY_TABLES = SHARDED_TABLES + ('conversations', 'conversation_participants')
+
+
+def shard_index(conversation_id, shard_count):
+    """رقم الجزء الذي تنتمي إليه المحادثة (تجزئة ثابتة بين العمليات)"""
+    return zlib.crc32(conversation_id.encode('utf-8')) % shard_count
+
+
+def shard_path(db_path, index):
+    """مسار ملف الجزء، مثلاً secure_chat.shard0.db"""
+    base, ext = os.path.splitext(db_path)
+    return f"{base}.shard{index}{ext or '.db'}"
+
+
+class ShardRouter:
+    """توجيه المحادثات إلى مجمعات اتصالات الأجزاء"""
+
+    def __init__(self, db_path, shard_count, pool_factory):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        self.db_path = db_path
+        self.shard_count = shard_count
+        self.pools = [pool_factory(shard_path(db_path, i)) for i in range(shard_count)]
+
+    def for_conversation(self, conversation_id):
+        """مجمع الاتصالات الخاص بجزء المحادثة"""
+        return self.pools[shard_index(conversation_id, self.shard_count)]
+
+    def group_by_shard(self, conversation_ids):
+        """تجميع معرفات المحادثات حسب الجزء"""
+        groups = {}
+        for conversation_id in conversation_ids:
+            pool = self.for_conversation(conversation_id)
+            groups.setdefault(pool, []).append(conversation_id)
+        return groups
+
+    def get_stats(self):
+        return [pool.get_stats() for pool in self.pools]
+
+    def close(self):
+        for pool in self.pools:
+            pool.close()
+
+
+def move_conversation(source, target, conversation_id):
+    """نقل بيانات محادثة من مجمع إلى آخر
+
+    النسخ يتم أولاً ثم الحذف، وكلاهما قابل للتكرار، لذلك يمكن إعادة تشغيل
+    الأداة بأمان بعد أي انقطاع.
+    """
+    with source.connection() as src:
+        data = {
+            table: src.execute(f"SELECT * FROM {table} WHERE conversation_id = ?",
+                               (conversation_id,)).fetchall()
+            for table in SHARDED_TABLES
+        }
+        columns = {
+            table: [row[1] for row in src.execute(f"PRAGMA table_info({table})")]
+            for table in SHARDED_TABLES
+        }
+
+    with target.connection(write=True) as dst:
+        for table in SHARDED_TABLES:
+            if not data[table]:
+                continue
+            names = ", ".join(columns[table])
+            marks = ", ".join("?" for _ in columns[table])
+            dst.executemany(f"INSERT OR IGNORE INTO {table} ({names}) VALUES ({marks})", data[table])
+
+    with source.connection(write=True) as src:
+        for table in SHARDED_TABLES:
+            src.execute(f"DELETE FROM {table} WHERE conversation_id = ?", (conversation_id,))
+
+    return len(data['messages'])
+
+
+def rebalance(db_path, from_count, to_count, log=print):
+    """إعادة توزيع الرسائل من عدد أجزاء إلى آخر (0 يعني قاعدة البيانات الرئيسية)"""
+    from database import DatabaseManager
+
+    # التوزيع الحالي يُهيأ أولاً حتى تُنقل رسائل المحادثات المدمجة في مكانها
+    # الحالي، ثم تهيئة المخطط في كل الأجزاء الهدف
+    source_db = DatabaseManager(db_path, shard_count=from_count)
+    target_db = (DatabaseManager(db_path, shard_count=to_count, allow_main_messages=True)
+                 if from_count != to_count else source_db)
+
+    sources = source_db.shards.pools if source_db.shards else [source_db.pool]
+    moved_conversations = 0
+    moved_messages = 0
+    for source in sources:
+        with source.connection() as conn:
+            conversation_ids = [row[0] for row in conn.execute("""
+                SELECT conversation_id FROM messages
+                UNION
+                SELECT conversation_id FROM conversation_summaries
+                UNION
+                SELECT conversation_id FROM conversation_reads
+            """)]
+
+        for conversation_id in conversation_ids:
+            target = target_db._message_pool(conversation_id)
+            if target.db_path == source.db_path:
+                continue
+            moved_messages += move_conversation(source, target, conversation_id)
+            moved_conversations += 1
+
+        log(f"{source.db_path}: checked {len(conversation_ids)} conversations")
+
+    log(f"Moved {moved_conversations} conversations ({moved_messages} messages)")
+    return moved_conversations, moved_messages
+
+
+def _storage_latency(conn):
+    """دالة SQL تنتظر عدداً من المللي ثانية (تحرر GIL مثل انتظار القرص)"""
+    conn.create_function("bench_wait", 1, lambda ms: time.sleep(ms / 1000))
+
+
+def benchmark(shard_counts=(1, 2, 4), threads=8, messages_per_thread=2000, conversations=64,
+              io_latency_ms=0.0):
+    """قياس معدل إدراج الرسائل حسب عدد الأجزاء
+
+    إرسال رسالة يكتب في جزء محادثتها فقط، لذلك يحد قفل كتابة الجزء من المعدل.
+    ``io_latency_ms`` يضيف انتظاراً لكل صف يُكتب في BENCH_LATENCY_TABLES داخل
+    المعاملة (مثل الكتابة على قرص شبكي أو بطيء) حتى يظهر أثر التوازي بين
+    الأقفال على جهاز بمعالج واحد، حيث يكون الإدراج بدونه محدوداً بالمعالج مهما
+    كان عدد الأجزاء. أي كتابة في القاعدة الرئيسية لكل رسالة تظهر هنا كسقف ثابت.
+    """
+    from database import DatabaseManager
+
+    results = {}
+    for shard_count in shard_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, "bench.db"), pool_size=threads,
+                                 shard_count=shard_count, on_connect=_storage_latency)
+            sender_id = db.create_user("bench", "bench@example.com", "x", "Bench")
+            conversation_ids = []
+            for _ in range(conversations):
+                conversation_id = db.create_conversation('private')
+                db.add_conversation_participant(conversation_id, sender_id)
+                conversation_ids.append(conversation_id)
+
+            if io_latency_ms > 0:
+                for pool in [db.pool] + (db.shards.pools if db.shards else []):
+                    with pool.connection(write=True) as conn:
+                        for table in BENCH_LATENCY_TABLES:
+                            for event in ("INSERT", "UPDATE"):
+                                conn.execute(f"""
+                                    CREATE TRIGGER IF NOT EXISTS bench_{table}_{event.lower()}
+                                    AFTER {event} ON {table}
+                                    BEGIN SELECT bench_wait({float(io_latency_ms)}); END
+                                """)
+
+            def worker(offset):
+                for i in range(messages_per_thread):
+                    conversation_id = conversation_ids[(offset + i * threads) % conversations]
+                    db.create_message(conversation_id, sender_id, "x" * 120, snippet="x")
+
+            workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            results[shard_count] = threads * messages_per_thread / elapsed
+            db.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="أدوات تقسيم تخزين الرسائل")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebalance_parser = commands.add_parser("rebalance", help="إعادة توزيع الرسائل على الأجزاء")
+    rebalance_parser.add_argument("--db", default="secure_chat.db")
+    rebalance_parser.add_argument("--from", dest="from_count", type=int, required=True)
+    rebalance_parser.add_argument("--to", dest="to_count", type=int, required=True)
+
+    bench_parser = commands.add_parser("bench", help="قياس معدل الكتابة حسب عدد الأجزاء")
+    bench_parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    bench_parser.add_argument("--threads", type=int, default=8)
+    bench_parser.add_argument("--messages", type=int, default=2000)
+    bench_parser.add_argument("--io-latency-ms", type=float, default=0.0,
+                              help="انتظار تخزين مصطنع لكل صف يكتبه إرسال الرسالة")
+
+    args = parser.parse_args(argv)
+    if args.command == "rebalance":
+        rebalance(args.db, args.from_count, args.to_count)
+    else:
+        results = benchmark(args.shards, args.threads, args.messages,
+                            io_latency_ms=args.io_latency_ms)
+        for shard_count, rate in results.items():
+            print(f"shards={shard_count}: {rate:,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""تشفير النصوص الكبيرة (المرفقات) على أجزاء بذاكرة ثابتة
+
+المدخلات قراء ملفات ثنائية أو مكررات أجزاء ``bytes`` بترميز UTF-8، والمخرجات
+مكررات أجزاء ``bytes`` يمكن كتابتها بـ ``write_chunks``. النتيجة مطابقة تماماً
+لتطبيق نفس المشفر على النص كاملاً:
+
+    with open(src, 'rb') as reader, open(dst, 'wb') as writer:
+        write_chunks(vigenere_stream(read_chunks(reader)), writer)
+
+الحرف متعدد البايتات المقسوم بين جزأين يُجمع قبل التشفير، وحالة المشفرات
+الموضعية (موضع مفتاح فيجنير، تبديل الحالة في المواقع الزوجية للمشفر المتطور)
+تنتقل من جزء إلى الذي يليه. المشفر المتطور يعكس النص، لذلك يحتاج قارئاً قابلاً
+للتنقل (seek) يُقرأ من النهاية إلى البداية.
+"""
+
+import codecs
+import io
+
+from encryption import SECRET_KEY, get_codec
+from encryption_utils import AdvancedCaesarCipher, CaesarCipher
+
+# حجم الجزء الافتراضي بالبايت
+CHUNK_SIZE = 64 * 1024
+
+# بايتات تكملة UTF-8 (10xxxxxx) لا تبدأ حرفاً
+_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+
+def read_chunks(reader, chunk_size=CHUNK_SIZE):
+    """قراءة ملف ثنائي على أجزاء"""
+    while True:
+        chunk = reader.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_chunks(chunks, writer):
+    """كتابة الأجزاء في ملف ثنائي، يعيد عدد البايتات المكتوبة"""
+    written = 0
+    for chunk in chunks:
+        writer.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def transform_chunks(chunks, transform, encoding='utf-8', errors='strict'):
+    """فك ترميز الأجزاء تدريجياً وتطبيق ``transform`` (نص -> نص) على كل جزء"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield transform(text).encode(encoding, errors)
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield transform(text).encode(encoding, errors)
+
+
+def caesar_stream(chunks, cipher=None, shift=None, decrypt=False):
+    """تشفير قيصر (أو فكه) على أجزاء؛ لا توجد حالة بين الأجزاء"""
+    if cipher is None:
+        cipher = CaesarCipher()
+    if decrypt:
+        return transform_chunks(chunks, lambda text: cipher.decrypt(text, shift))
+    return transform_chunks(chunks, lambda text: cipher.encrypt(text, shift))
+
+
+def vigenere_stream(chunks, key=SECRET_KEY, decrypt=False):
+    """تشفير فيجنير (أو فكه) على أجزاء مع متابعة موضع المفتاح"""
+    codec = get_codec(key)
+    return transform_chunks(chunks, codec.decoder() if decrypt else codec.encoder())
+
+
+def _count_chars(reader, chunk_size):
+    """عدد أحرف UTF-8 في القارئ (البايتات التي ليست بايتات تكملة)"""
+    reader.seek(0)
+    return sum(len(chunk.translate(None, _CONTINUATION_BYTES))
+               for chunk in read_chunks(reader, chunk_size))
+
+
+def read_reversed_text(reader, chunk_size=CHUNK_SIZE, encoding='utf-8', errors='strict'):
+    """قراءة ملف UTF-8 من النهاية إلى البداية، يعيد أجزاء النص معكوسة
+
+    ربط الأجزاء الناتجة يساوي ``reader.read().decode()[::-1]``. بايتات التكملة
+    في بداية كل جزء تنتمي لحرف بدأ في الجزء السابق، فتُؤجل إليه.
+    """
+    position = reader.seek(0, io.SEEK_END)
+    carry = b''
+    while position > 0:
+        size = min(chunk_size, position)
+        position -= size
+        reader.seek(position)
+        data = reader.read(size) + carry
+        start = 0
+        if position > 0:
+            # حرف UTF-8 لا يتجاوز 4 بايتات، لذلك تكفي 3 بايتات تكملة على الأكثر
+            while start < min(3, len(data)) and data[start] in _CONTINUATION_BYTES:
+                start += 1
+        carry = data[:start]
+        text = data[start:].decode(encoding, errors)
+        if text:
+            yield text[::-1]
+
+
+def advanced_stream(reader, cipher=None, decrypt=False, chunk_size=CHUNK_SIZE):
+    """التشفير المتطور (أو فكه) لملف UTF-8 قابل للتنقل على أجزاء
+
+    التشفير: قيصر ثم عكس النص ثم تبديل الحالة في المواقع الزوجية من بداية الناتج،
+    لذلك يكفي عداد للأحرف الصادرة. فك التشفير يبدل الحالة حسب المواقع في النص
+    المشفر الأصلي قبل عكسه، فيُحسب عدد أحرفه أولاً بقراءة إضافية خفيفة.
+    """
+    if cipher is None:
+        cipher = AdvancedCaesarCipher()
+    swap_case = AdvancedCaesarCipher._swap_case
+
+    if not decrypt:
+        emitted = 0
+        for text in read_reversed_text(reader, chunk_size):
+            yield swap_case(cipher.encrypt(text), emitted).encode('utf-8')
+            emitted += len(text)
+        return
+
+    # الجزء يُعاد لترتيبه الأصلي لتبديل الحالة ثم يُعكس، كما في النص الكامل
+    # (بعض الأحرف تتحول لأكثر من حرف عند تغيير الحالة)
+    end = _count_chars(reader, chunk_size)
+    for text in read_reversed_text(reader, chunk_size):
+        end -= len(text)
+        yield cipher.decrypt(swap_case(text[::-1], end)[::-1]).encode('utf-8')
@@ -0,0 +1,86 @@
+"""التنفيذات الأصلية (حرفاً بحرف) لقيصر وفيجنير، مرجع لاختبارات التكافؤ"""
+
+
+def caesar_encrypt(text, shift):
+    result = ""
+    for char in text:
+        if char.isalpha():
+            ascii_offset = 65 if char.isupper() else 97
+            shifted = (ord(char) - ascii_offset + shift) % 26
+            result += chr(shifted + ascii_offset)
+        elif char.isdigit():
+            shifted = (int(char) + shift) % 10
+            result += str(shifted)
+        else:
+            result += char
+    return result
+
+
+def caesar_decrypt(encrypted_text, shift):
+    result = ""
+    for char in encrypted_text:
+        if char.isalpha():
+            ascii_offset = 65 if char.isupper() else 97
+            shifted = (ord(char) - ascii_offset - shift) % 26
+            result += chr(shifted + ascii_offset)
+        elif char.isdigit():
+            shifted = (int(char) - shift) % 10
+            result += str(shifted)
+        else:
+            result += char
+    return result
+
+
+def _swap_even(text):
+    result = ""
+    for i, char in enumerate(text):
+        if char.isalpha():
+            if i % 2 == 0:
+                result += char.upper() if char.islower() else char.lower()
+            else:
+                result += char
+        else:
+            result += char
+    return result
+
+
+def advanced_encrypt(text, shift=13):
+    return _swap_even(caesar_encrypt(text, shift)[::-1])
+
+
+def advanced_decrypt(encrypted_text, shift=13):
+    return caesar_decrypt(_swap_even(encrypted_text)[::-1], shift)
+
+
+def vigenere_encrypt(text, key):
+    encrypted = []
+    key = key.lower()
+    key_index = 0
+    for char in text:
+        if char.isalpha():
+            shift = ord(key[key_index % len(key)]) - ord('a')
+            if char.islower():
+                encrypted.append(chr((ord(char) - ord('a') + shift) % 26 + ord('a')))
+            else:
+                encrypted.append(chr((ord(char) - ord('A') + shift) % 26 + ord('A')))
+            key_index += 1
+        else:
+            encrypted.append(char)
+    return "".join(encrypted)
+
+
+def vigenere_decrypt(text, key):
+    decrypted = []
+    key = key.lower()
+    key_index = 0
+    for char in text:
+        if char.isalpha():
+            shift = ord(key[key_index % len(key)]) - ord('a')
+            if char.islower():
+                decrypted.append(chr((ord(char) - ord('a') - shift) % 26 + ord('a')))
+            else:
+                decrypted.append(chr((ord(char) - ord('A') - shift) % 26 + ord('A')))
+            key_index += 1
+        else:
+            decrypted.append(char)
+    return "".join(decrypted)
@@ -0,0 +1,79 @@
+"""تكافؤ التشفير المتطور المدمج مع التنفيذ الأصلي على نصوص عشوائية ثابتة البذرة"""
+import random
+import string
+
+import pytest
+
+from encryption_utils import AdvancedCaesarCipher
+from legacy_cipher import advanced_decrypt, advanced_encrypt
+
+SEED = 20251018
+CASES = 2000
+
+ARABIC = "ابتثجحخدذرزسشصضطظعغفقكلمنهويءآأؤإئةى"
+# أحرف تتغير أطوالها عند تغيير الحالة (ß -> SS، ŉ -> ʼN، İ -> i̇)، وأرقام
+# عربية هندية، وتشكيل، ورموز تعبيرية مركبة
+SPECIAL = ["ß", "ŉ", "İ", "ﬁ", "٣", "٧", "َ", "ّ", "😀", "👍🏽", "👨‍👩‍👧", "🇸🇦"]
+MIXED_ALPHABET = list(ARABIC + string.ascii_letters + string.digits + " .,!?-_\n") + SPECIAL
+ASCII_ALPHABET = list(string.ascii_letters + string.digits + string.punctuation + " \n")
+# نصوص تعود كما هي (قيصر يحول كل حرف أبجدي إلى ASCII)
+ROUND_TRIP_ALPHABET = ASCII_ALPHABET + ["😀", "👍🏽", "َ"]
+
+
+def random_texts(alphabet, seed, count=CASES, max_length=300):
+    rng = random.Random(seed)
+    return ["".join(rng.choices(alphabet, k=rng.randint(0, max_length))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("shift", [13, 1, 7, 25, 140])
+def test_matches_legacy_on_mixed_text(shift):
+    cipher = AdvancedCaesarCipher(default_shift=shift)
+    for text in random_texts(MIXED_ALPHABET, SEED + shift):
+        assert cipher.advanced_encrypt(text) == advanced_encrypt(text, shift), repr(text)
+        # فك نص عشوائي (ليس ناتج تشفير) يغطي أيضاً مسار الأحرف متعددة الأطوال
+        assert cipher.advanced_decrypt(text) == advanced_decrypt(text, shift), repr(text)
+
+
+def test_matches_legacy_on_ascii_text():
+    cipher = AdvancedCaesarCipher()
+    for text in random_texts(ASCII_ALPHABET, SEED + 1):
+        assert cipher.advanced_encrypt(text) == advanced_encrypt(text)
+        assert cipher.advanced_decrypt(text) == advanced_decrypt(text)
+
+
+def test_batches_match_legacy():
+    cipher = AdvancedCaesarCipher()
+    texts = random_texts(MIXED_ALPHABET, SEED + 2, count=300)
+    encrypted = cipher.advanced_encrypt_many(texts)
+    assert encrypted == [advanced_encrypt(text) for text in texts]
+    assert cipher.advanced_decrypt_many(encrypted) == [advanced_decrypt(text) for text in encrypted]
+
+
+def test_round_trip():
+    cipher = AdvancedCaesarCipher()
+    for text in random_texts(ROUND_TRIP_ALPHABET, SEED + 3):
+        assert cipher.advanced_decrypt(cipher.advanced_encrypt(text)) == text
+
+
+def test_round_trip_matches_legacy_on_mixed_text():
+    cipher = AdvancedCaesarCipher()
+    for text in random_texts(MIXED_ALPHABET, SEED + 4, count=500):
+        expected = advanced_decrypt(advanced_encrypt(text))
+        assert cipher.advanced_decrypt(cipher.advanced_encrypt(text)) == expected
+
+
+@pytest.mark.parametrize("text", ["ß", "ßa", "aßß", "ŉx", "İ", "ﬁ", "مرحبا😀ß"])
+def test_multi_character_case_fallback(text):
+    # حرف في موقع زوجي يصبح أكثر من حرف عند تبديل حالته
+    cipher = AdvancedCaesarCipher()
+    decrypted = cipher.advanced_decrypt(text)
+    assert decrypted == advanced_decrypt(text)
+    assert len(decrypted) > len(text)
+
+
+@pytest.mark.parametrize("text", ["aß", "xİyß", "مرحباß😀ﬁ"])
+def test_multi_character_letters_in_odd_positions(text):
+    cipher = AdvancedCaesarCipher()
+    decrypted = cipher.advanced_decrypt(text)
+    assert decrypted == advanced_decrypt(text)
+    assert len(decrypted) == len(text)
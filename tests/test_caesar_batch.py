@@ -0,0 +1,37 @@
+"""تشفير قيصر على دفعات: نفس نتيجة التنفيذ الأصلي لكل نص مهما اختلطت الدفعة"""
+import random
+
+import pytest
+
+from encryption_utils import CaesarCipher
+from legacy_cipher import caesar_decrypt, caesar_encrypt
+from test_advanced_cipher import ASCII_ALPHABET, MIXED_ALPHABET, SEED, random_texts
+
+# أحرف غير ASCII ليست حروفاً ولا أرقاماً (تبقى كما هي)، مثل ما في النصوص المشفرة
+SYMBOLS = ["،", "؟", "َ", "ّ", "😀", "👍🏽", "\ud800", "½", "…"]
+CIPHERTEXT_ALPHABET = ASCII_ALPHABET + SYMBOLS
+
+
+def mixed_batch(seed, count=400):
+    """دفعة تخلط نصوص ASCII ونصوصاً مشفرة ونصوصاً عربية بترتيب عشوائي"""
+    rng = random.Random(seed)
+    alphabets = [ASCII_ALPHABET, CIPHERTEXT_ALPHABET, MIXED_ALPHABET]
+    return [random_texts(rng.choice(alphabets), seed + i, count=1, max_length=80)[0]
+            for i in range(count)]
+
+
+@pytest.mark.parametrize("shift", [7, 1, 13, 25, 140])
+@pytest.mark.parametrize("alphabet", [ASCII_ALPHABET, CIPHERTEXT_ALPHABET, MIXED_ALPHABET])
+def test_batches_match_legacy(shift, alphabet):
+    cipher = CaesarCipher()
+    texts = random_texts(alphabet, SEED + shift, count=300, max_length=120)
+    assert cipher.encrypt_many(texts, shift) == [caesar_encrypt(text, shift) for text in texts]
+    assert cipher.decrypt_many(texts, shift) == [caesar_decrypt(text, shift) for text in texts]
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 400])
+def test_mixed_batches_keep_order(size):
+    cipher = CaesarCipher()
+    texts = mixed_batch(SEED + size)[:size]
+    assert cipher.decrypt_many(iter(texts)) == [cipher.decrypt(text) for text in texts]
+    assert cipher.encrypt_many(texts) == [cipher.encrypt(text) for text in texts]
@@ -0,0 +1,165 @@
+"""ترحيل قاعدة بيانات بالمخطط الأصلي مع بيانات، ثم التحقق من خطط الاستعلامات والبيانات المرحلة"""
+import sqlite3
+
+import pytest
+
+from database import DatabaseManager
+from migrations import LATEST_VERSION, check_query_plans, get_schema_version
+
+# المخطط قبل نظام الترحيلات (DatabaseManager.init_database الأصلية)
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id TEXT PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    avatar TEXT,
+    is_online BOOLEAN DEFAULT FALSE,
+    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE friendships (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    friend_id TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id),
+    FOREIGN KEY (friend_id) REFERENCES users (id)
+);
+CREATE TABLE conversations (
+    id TEXT PRIMARY KEY,
+    type TEXT DEFAULT 'private',
+    name TEXT,
+    avatar TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE conversation_participants (
+    id TEXT PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    role TEXT DEFAULT 'member',
+    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (conversation_id) REFERENCES conversations (id),
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+CREATE TABLE messages (
+    id TEXT PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    sender_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    message_type TEXT DEFAULT 'text',
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (conversation_id) REFERENCES conversations (id),
+    FOREIGN KEY (sender_id) REFERENCES users (id)
+);
+"""
+
+USER_COUNT = 40
+MESSAGES_PER_CONVERSATION = 25
+
+
+def timestamp(minute):
+    return f"2024-01-01 {minute // 60:02d}:{minute % 60:02d}:00"
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """قاعدة بيانات بالمخطط الأصلي: صداقات في اتجاه واحد مع صف مكرر،
+    ومحادثة خاصة مكررة بين u0 وu1، ورسائل is_read فيها لم يُستخدم"""
+    path = str(tmp_path / "chat.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+
+    users = [f"u{i}" for i in range(USER_COUNT)]
+    conn.executemany("""
+        INSERT INTO users (id, username, email, password_hash, display_name)
+        VALUES (?, ?, ?, 'hash', ?)
+    """, [(u, f"user{u}", f"{u}@example.com", f"User {u}") for u in users])
+
+    friendships = [(users[i], users[i + 1]) for i in range(USER_COUNT - 1)]
+    friendships.append((users[0], users[1]))
+    conn.executemany("""
+        INSERT INTO friendships (id, user_id, friend_id, status) VALUES (?, ?, ?, 'accepted')
+    """, [(f"f{n}", a, b) for n, (a, b) in enumerate(friendships)])
+
+    # c0 وc1 بين نفس الزوج: c0 الأقدم تبقى وc1 تُدمج فيها
+    pairs = [(users[0], users[1])] + [(users[i], users[i + 1]) for i in range(USER_COUNT - 1)]
+    minute = 0
+    for n, (a, b) in enumerate(pairs):
+        conversation_id = f"c{n}"
+        conn.execute("INSERT INTO conversations (id, type, created_at, updated_at) VALUES (?, 'private', ?, ?)",
+                     (conversation_id, timestamp(n), timestamp(n)))
+        conn.executemany("""
+            INSERT INTO conversation_participants (id, conversation_id, user_id) VALUES (?, ?, ?)
+        """, [(f"p{n}{a}", conversation_id, a), (f"p{n}{b}", conversation_id, b)])
+        for k in range(MESSAGES_PER_CONVERSATION):
+            minute += 1
+            conn.execute("""
+                INSERT INTO messages (id, conversation_id, sender_id, content, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (f"m{n}-{k}", conversation_id, a if k % 2 else b, f"Khoor {k}", timestamp(minute)))
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def migrated(baseline_db, monkeypatch):
+    monkeypatch.delenv("DB_SHARDS", raising=False)
+    db = DatabaseManager(baseline_db, shard_count=0)
+    yield db
+    db.close()
+
+
+def test_migrates_to_latest_version(migrated):
+    with migrated.pool.connection() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+
+
+def test_hot_queries_use_indexes(migrated):
+    with migrated.pool.connection() as conn:
+        report = check_query_plans(conn)
+    assert {name: entry['full_scans'] for name, entry in report.items() if not entry['ok']} == {}
+    assert all(entry['ok'] for entry in report.values())
+    # صفحات الرسائل تُقرأ بترتيب الفهرس مباشرة بدون فرز
+    for name in ('conversation_messages', 'conversation_messages_before', 'conversation_messages_after'):
+        assert not any("TEMP B-TREE" in detail for detail in report[name]['plan']), report[name]['plan']
+
+
+def test_duplicate_private_conversations_are_merged(migrated):
+    assert migrated.find_private_conversation("u0", "u1").id == "c0"
+    with migrated.pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM conversations WHERE id = 'c1'").fetchone()[0] == 0
+        assert conn.execute("SELECT messages_moved FROM conversation_merges WHERE duplicate_id = 'c1'"
+                            ).fetchone()[0] == 1
+        seqs = [row[0] for row in conn.execute(
+            "SELECT seq FROM messages WHERE conversation_id = 'c0' ORDER BY seq")]
+    assert seqs == list(range(1, 2 * MESSAGES_PER_CONVERSATION + 1))
+    assert migrated.get_conversation_version("c0") == 2 * MESSAGES_PER_CONVERSATION
+
+
+def test_keyset_pages_cover_merged_conversation(migrated):
+    seen = []
+    page = migrated.get_conversation_messages_page("c0", limit=7)
+    seen[:0] = [m['id'] for m in page['messages']]
+    while page['has_older']:
+        page = migrated.get_conversation_messages_page("c0", limit=7, before=page['older_cursor'])
+        seen[:0] = [m['id'] for m in page['messages']]
+    expected = [f"m{n}-{k}" for n in (0, 1) for k in range(MESSAGES_PER_CONVERSATION)]
+    assert seen == expected
+
+
+def test_friendships_are_symmetric(migrated):
+    assert {f['id'] for f in migrated.get_user_friends("u1")} == {"u0", "u2"}
+    assert {f['id'] for f in migrated.get_user_friends("u0")} == {"u1"}
+
+
+def test_legacy_messages_are_read_and_new_ones_count(migrated):
+    assert migrated.get_unread_count("u1") == 0
+    migrated.create_message("c0", "u0", "Khoor")
+    assert migrated.get_unread_count("u1") == 1
+    assert migrated.get_unread_count("u0") == 0
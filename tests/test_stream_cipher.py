@@ -0,0 +1,137 @@
+"""تشفير الأجزاء: ذاكرة ثابتة مهما كبر الحجم، ونتيجة مطابقة للنص الكامل"""
+import io
+import tracemalloc
+
+import pytest
+
+from encryption import SECRET_KEY, get_codec
+from encryption_utils import AdvancedCaesarCipher, CaesarCipher
+from stream_cipher import advanced_stream, caesar_stream, read_chunks, vigenere_stream
+
+# عربي ولاتيني وأرقام وأحرف متعددة البايتات (2 و 3 و 4 بايت) وأحرف تتغير
+# أطوالها عند تغيير الحالة
+SAMPLE = "مرحبا Hello, عالم! 123 café ñ ß İ ŉ ﬁ 😀👍🏽 Straße\n"
+
+# نص ASCII يعود كما هو بعد التشفير وفكه (قيصر يحول أي حرف أبجدي إلى ASCII)
+ASCII_SAMPLE = "Hello, World! 0123456789 The quick brown fox jumps.\n"
+
+CHUNK_SIZES = [1, 2, 3, 5, 7, 64]
+
+
+def split_bytes(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def joined(chunks):
+    return b''.join(chunks).decode('utf-8')
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_caesar_stream_matches_whole_text(chunk_size):
+    text = SAMPLE * 5
+    cipher = CaesarCipher()
+    encrypted = joined(caesar_stream(split_bytes(text.encode(), chunk_size), cipher))
+    assert encrypted == cipher.encrypt(text)
+    decrypted = joined(caesar_stream(split_bytes(encrypted.encode(), chunk_size), cipher, decrypt=True))
+    assert decrypted == cipher.decrypt(encrypted)
+
+
+@pytest.mark.parametrize("key", [SECRET_KEY, "bd", "abcdefg"])
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_vigenere_stream_keeps_key_index_across_chunks(chunk_size, key):
+    text = SAMPLE * 5
+    codec = get_codec(key)
+    encrypted = joined(vigenere_stream(split_bytes(text.encode(), chunk_size), key))
+    assert encrypted == codec.encrypt(text)
+    decrypted = joined(vigenere_stream(split_bytes(encrypted.encode(), chunk_size), key, decrypt=True))
+    assert decrypted == codec.decrypt(encrypted)
+
+
+def test_vigenere_stream_continues_key_inside_a_word():
+    codec = get_codec("bd")
+    assert joined(vigenere_stream([b"Hel", b"lo Wo", b"rld"], "bd")) == codec.encrypt("Hello World")
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", [SAMPLE * 5, ASCII_SAMPLE * 5, "ß" * 9, "aß" * 9])
+def test_advanced_stream_keeps_case_flip_positions(chunk_size, text):
+    cipher = AdvancedCaesarCipher()
+    encrypted = joined(advanced_stream(io.BytesIO(text.encode()), cipher, chunk_size=chunk_size))
+    assert encrypted == cipher.advanced_encrypt(text)
+    decrypted = joined(advanced_stream(io.BytesIO(encrypted.encode()), cipher, decrypt=True,
+                                       chunk_size=chunk_size))
+    assert decrypted == cipher.advanced_decrypt(encrypted)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_advanced_stream_round_trip(chunk_size):
+    text = ASCII_SAMPLE * 5 + "😀"
+    cipher = AdvancedCaesarCipher()
+    encrypted = b''.join(advanced_stream(io.BytesIO(text.encode()), cipher, chunk_size=chunk_size))
+    assert joined(advanced_stream(io.BytesIO(encrypted), cipher, decrypt=True,
+                                  chunk_size=chunk_size)) == text
+
+
+# ---- الذاكرة ----
+
+CHUNK = 16 * 1024
+SMALL = 1024 * 1024
+LARGE = 4 * 1024 * 1024
+BLOCK = (SAMPLE * (CHUNK // len(SAMPLE.encode()))).encode()
+
+
+def payload(size):
+    """أجزاء بحجم ``size`` تقريباً بدون الاحتفاظ بها في الذاكرة"""
+    for _ in range(size // len(BLOCK)):
+        yield BLOCK
+
+
+def write_payload(path, size):
+    with open(path, 'wb') as writer:
+        for block in payload(size):
+            writer.write(block)
+    return path
+
+
+def peak_memory(make_stream):
+    """أعلى استخدام للذاكرة أثناء استهلاك الأجزاء الناتجة وإهمالها"""
+    tracemalloc.start()
+    try:
+        for _ in make_stream():
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def assert_flat(small_peak, large_peak):
+    # أربعة أضعاف الحجم بدون زيادة تُذكر، والذروة أقل بكثير من حجم النص الكبير
+    assert large_peak < small_peak * 1.25 + CHUNK
+    assert large_peak < LARGE / 4
+
+
+@pytest.mark.parametrize("stream", [caesar_stream, vigenere_stream])
+def test_stream_memory_is_flat(stream):
+    small = peak_memory(lambda: stream(payload(SMALL)))
+    large = peak_memory(lambda: stream(payload(LARGE)))
+    assert_flat(small, large)
+
+
+@pytest.mark.parametrize("decrypt", [False, True])
+def test_advanced_stream_memory_is_flat(tmp_path, decrypt):
+    peaks = []
+    for size in (SMALL, LARGE):
+        path = write_payload(tmp_path / f"{size}.txt", size)
+
+        def make_stream():
+            with open(path, 'rb') as reader:
+                yield from advanced_stream(reader, decrypt=decrypt, chunk_size=CHUNK)
+
+        peaks.append(peak_memory(make_stream))
+    assert_flat(*peaks)
+
+
+def test_read_chunks_reads_whole_file(tmp_path):
+    path = write_payload(tmp_path / "payload.txt", SMALL)
+    with open(path, 'rb') as reader:
+        assert b''.join(read_chunks(reader, 1000)) == path.read_bytes()
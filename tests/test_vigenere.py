@@ -0,0 +1,36 @@
+"""تكافؤ مشفر فيجنير بالجداول مع التنفيذ الأصلي، بما في ذلك المفاتيح الغريبة"""
+import pytest
+
+from encryption import VigenereCodec
+from legacy_cipher import vigenere_decrypt, vigenere_encrypt
+from test_advanced_cipher import ASCII_ALPHABET, MIXED_ALPHABET, SEED, random_texts
+
+# مفاتيح بلا أحرف أو بأحرف غير ASCII أو تتغير أطوالها بالتحويل إلى أحرف صغيرة
+KEYS = ["securechat", "bd", "Key", "123", "!!", "a b", "مفتاح", "İ", "ß"]
+
+
+@pytest.mark.parametrize("key", KEYS)
+@pytest.mark.parametrize("alphabet", [ASCII_ALPHABET, MIXED_ALPHABET])
+def test_matches_legacy(key, alphabet):
+    codec = VigenereCodec(key)
+    # أطوال حتى 600 تمر على مسار الأحرف ومسار الشرائح (_SHORT_TEXT)
+    for text in random_texts(alphabet, SEED + len(key), count=200, max_length=600):
+        assert codec.encrypt(text) == vigenere_encrypt(text, key), repr(text)
+        assert codec.decrypt(text) == vigenere_decrypt(text, key), repr(text)
+
+
+@pytest.mark.parametrize("text", ["", "123 !", "١٢٣ ²", "1 " * 300])
+def test_empty_key_keeps_text_without_letters(text):
+    codec = VigenereCodec("")
+    assert codec.encrypt(text) == vigenere_encrypt(text, "") == text
+    assert codec.decrypt(text) == text
+
+
+@pytest.mark.parametrize("text", ["Hello", "مرحبا", "x" * 300])
+def test_empty_key_rejects_letters_like_legacy(text):
+    with pytest.raises(ZeroDivisionError):
+        vigenere_encrypt(text, "")
+    with pytest.raises(ZeroDivisionError):
+        VigenereCodec("").encrypt(text)
+    with pytest.raises(ZeroDivisionError):
+        VigenereCodec("").decoder()(text)
@@ -0,0 +1,151 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# التشكيل العربي والتطويل تُحذف قبل الفهرسة
+_ARABIC_MARKS = re.compile('[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+
+# توحيد أشكال الحروف التي يكتبها المستخدمون بطرق مختلفة
+_ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+})
+
+# فواصل الكلمات كما يراها مقسم unicode61 (الشرطة السفلية فاصل أيضاً)
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def normalize_search_text(text):
+    """توحيد النص للبحث: إزالة التشكيل وتوحيد الحروف العربية وتجاهل حالة الأحرف"""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKC', text)
+    text = _ARABIC_MARKS.sub('', text)
+    return text.translate(_ARABIC_LETTERS).casefold()
+
+
+def tokenize_search_text(text):
+    """تقسيم النص الموحد إلى كلمات"""
+    return _TOKEN_PATTERN.findall(normalize_search_text(text))
+
+
+def build_match_query(query):
+    """بناء استعلام FTS5 يطابق بداية كل كلمة في نص البحث"""
+    tokens = tokenize_search_text(query)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _index_row(rowid, username, email, display_name):
+    return (rowid, normalize_search_text(username), normalize_search_text(email),
+            normalize_search_text(display_name))
+
+
+def index_user(conn, rowid, username, email, display_name):
+    """كتابة نص المستخدم الموحد في users_fts (داخل معاملة الكتابة نفسها)
+
+    التوحيد يتم في بايثون وليس في مشغلات SQL، حتى يستطيع أي كاتب آخر
+    (سطر أوامر sqlite3، النسخ الاحتياطي) تعديل جدول users بدون دوال مخصصة.
+    """
+    conn.execute("DELETE FROM users_fts WHERE rowid = ?", (rowid,))
+    conn.execute("""
+        INSERT INTO users_fts (rowid, username, email, display_name)
+        VALUES (?, ?, ?, ?)
+    """, _index_row(rowid, username, email, display_name))
+
+
+def rebuild_user_index(conn):
+    """إعادة بناء users_fts بالكامل من جدول users"""
+    rows = conn.execute("SELECT rowid, username, email, display_name FROM users").fetchall()
+    conn.execute("DELETE FROM users_fts")
+    conn.executemany("""
+        INSERT INTO users_fts (rowid, username, email, display_name)
+        VALUES (?, ?, ?, ?)
+    """, [_index_row(*row) for row in rows])
+
+
+def _row_matches(row, tokens):
+    """هل تبدأ كلمة من حقول المستخدم بكل كلمة من كلمات البحث؟"""
+    row_tokens = []
+    for field in ('username', 'email', 'display_name'):
+        row_tokens.extend(tokenize_search_text(row.get(field)))
+    return all(any(word.startswith(token) for word in row_tokens) for token in tokens)
+
+
+class PrefixSearchCache:
+    """ذاكرة مؤقتة لنتائج البحث تعيد استخدام نتائج البادئات
+
+    عند تضييق البحث (مثلاً من "ali" إلى "alic") تكون النتائج الجديدة جزءاً من
+    نتائج البادئة، فإذا كانت نتائج البادئة كاملة تتم تصفيتها في الذاكرة بدلاً من
+    الرجوع إلى SQLite.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.narrowed = 0
+        self.misses = 0
+
+    def get(self, query, exclude_user_id):
+        """البحث في الذاكرة المؤقتة، يعيد None عند عدم التوفر"""
+        tokens = tokenize_search_text(query)
+        key = " ".join(tokens)
+        with self._lock:
+            entry = self._entries.get((exclude_user_id, key))
+            if entry is not None:
+                self._entries.move_to_end((exclude_user_id, key))
+                self.hits += 1
+                return entry[0]
+
+            # البحث عن أطول بادئة مخزنة بنتائج كاملة
+            for length in range(len(key) - 1, 0, -1):
+                prefix_entry = self._entries.get((exclude_user_id, key[:length].rstrip()))
+                if prefix_entry is not None and prefix_entry[1]:
+                    rows = [row for row in prefix_entry[0] if _row_matches(row, tokens)]
+                    self._store(exclude_user_id, key, rows, True)
+                    self.narrowed += 1
+                    return rows
+
+            self.misses += 1
+            return None
+
+    def put(self, query, exclude_user_id, rows, complete, generation):
+        """تخزين نتائج استعلام، ``complete`` يعني أنها لم تُقتطع بالحد الأقصى
+
+        ``generation`` هو قيمة ``self.generation`` قبل تنفيذ الاستعلام، وتُهمل
+        النتائج إذا تم مسح الذاكرة أثناء التنفيذ.
+        """
+        key = " ".join(tokenize_search_text(query))
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._store(exclude_user_id, key, rows, complete)
+
+    def _store(self, exclude_user_id, key, rows, complete):
+        self._entries[(exclude_user_id, key)] = (rows, complete)
+        self._entries.move_to_end((exclude_user_id, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """مسح جميع النتائج (عند إضافة أو تعديل مستخدم)"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def get_stats(self):
+        """الحصول على إحصائيات الذاكرة المؤقتة"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'narrowed': self.narrowed,
+                'misses': self.misses,
+            }